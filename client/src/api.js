@@ -34,16 +34,21 @@ export const authAPI = {
 
 // Meal Plans API
 export const mealPlansAPI = {
-  generate: (data) => api.post('/mealplans/generate', data),
+  generate: (data, idempotencyKey) => api.post('/mealplans/generate', data, {
+    headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {},
+  }),
   getAll: () => api.get('/mealplans/'),
   getOne: (id) => api.get(`/mealplans/${id}`),
   delete: (id) => api.delete(`/mealplans/${id}`),
   update: (id, data) => api.put(`/mealplans/${id}`, data),
+  search: (q) => api.get('/mealplans/search', { params: { q } }),
+  regenerate: (id, data) => api.post(`/mealplans/${id}/regenerate`, data),
 };
 
 // Dashboard API
 export const dashboardAPI = {
   getSummary: () => api.get('/dashboard/summary'),
+  bootstrap: () => api.get('/dashboard/bootstrap'),
 };
 
 export default api;
@@ -32,12 +32,10 @@ export default function Dashboard({ user, onLogout }) {
 
   const loadDashboard = async () => {
     try {
-      const [summaryRes, plansRes] = await Promise.all([
-        dashboardAPI.getSummary(),
-        mealPlansAPI.getAll()
-      ]);
-      setSummary(summaryRes.data);
-      setMealPlans(plansRes.data.meal_plans);
+      // One request for the statistics and the plan list
+      const response = await dashboardAPI.bootstrap();
+      setSummary(response.data);
+      setMealPlans(response.data.meal_plans);
     } catch (err) {
       setError('Failed to load dashboard data');
     } finally {
@@ -49,9 +47,10 @@ export default function Dashboard({ user, onLogout }) {
   if (window.confirm('Are you sure you want to delete this meal plan? This action cannot be undone.')) {
     try {
       await mealPlansAPI.delete(planId);
-      // Refresh the meal plans list after successful deletion
-      const plansRes = await mealPlansAPI.getAll();
-      setMealPlans(plansRes.data.meal_plans);
+      // Refresh the meal plans list and statistics after successful deletion
+      const response = await dashboardAPI.bootstrap();
+      setSummary(response.data);
+      setMealPlans(response.data.meal_plans);
       
       // Optionally show a success message
       // alert('Meal plan deleted successfully!');
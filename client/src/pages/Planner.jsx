@@ -1,4 +1,4 @@
-import { useState } from 'react';
+import { useRef, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import Header from '../components/Header';
 import { mealPlansAPI } from '../api';
@@ -12,10 +12,13 @@ export default function Planner({ user, onLogout }) {
   });
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
+  // Reused when the same form is resubmitted, so a retry never creates a duplicate plan
+  const idempotencyKey = useRef(null);
   const navigate = useNavigate();
 
   const handleChange = (e) => {
     const value = e.target.type === 'number' ? parseInt(e.target.value) : e.target.value;
+    idempotencyKey.current = null;
     setFormData({
       ...formData,
       [e.target.name]: value
@@ -26,9 +29,12 @@ export default function Planner({ user, onLogout }) {
     e.preventDefault();
     setError('');
     setLoading(true);
+    if (!idempotencyKey.current) {
+      idempotencyKey.current = crypto.randomUUID();
+    }
 
     try {
-      const response = await mealPlansAPI.generate(formData);
+      const response = await mealPlansAPI.generate(formData, idempotencyKey.current);
       navigate(`/plan/${response.data.meal_plan.id}`);
     } catch (err) {
       const errorMessage = err.response?.data?.error || 
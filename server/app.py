@@ -23,30 +23,61 @@ load_dotenv()
 from routes.auth import auth_bp
 from routes.mealplans import mealplans_bp
 from routes.dashboard import dashboard_bp
-from db import init_db
+from routes.admin import admin_bp
+from db import check_config, init_db, STORAGE_BACKEND
+from serialization import FastJSONProvider
+import cold_store
+import concurrency
+from services import analytics
+
+# Set by gunicorn.conf.py: with preload_app the master only imports the
+# app, and each worker recovers the store in post_fork
+DEFER_STORE_START = os.getenv('DEFER_STORE_START') == '1'
+
+def create_app() -> Flask:
+    """Application factory used by the dev server and production entry points."""
+    check_config()
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+
+    # Configure CORS - allow all origins for development
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": "*",
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization", "Idempotency-Key"]
+        }
+    })
+
+    if not DEFER_STORE_START:
+        start_store()
 
-# Initialize Flask app
-app = Flask(__name__)
+    # Register blueprints
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(mealplans_bp, url_prefix='/api/mealplans')
+    app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
 
-# Configure CORS - allow all origins for development
-CORS(app, resources={
-    r"/api/*": {
-        "origins": "*",
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
-    }
-})
+    app.add_url_rule('/', view_func=index)
+    app.add_url_rule('/api/health', view_func=health, methods=['GET'])
+    app.register_error_handler(404, not_found)
+    app.register_error_handler(500, internal_error)
+    concurrency.init_app(app)
 
-# Initialize database with test data
-init_db()
+    return app
 
-# Register blueprints
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(mealplans_bp, url_prefix='/api/mealplans')
-app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
+
+def start_store():
+    """
+    Recover the store, seed test data and start the background threads
+    (operation log flusher, cold store sweeper, analytics snapshots).
+    Runs in the process that serves requests.
+    """
+    init_db()
+    analytics.start_snapshots()
+    cold_store.start_sweeper()
 
 
-@app.route('/')
 def index():
     """Health check endpoint."""
     return jsonify({
@@ -56,37 +87,53 @@ def index():
     })
 
 
-@app.route('/api/health', methods=['GET'])
 def health():
     """Detailed health check."""
-    import os
-    
     openai_configured = bool(os.getenv('OPENAI_API_KEY'))
     
     return jsonify({
         'status': 'healthy',
-        'database': 'in-memory',
+        'database': STORAGE_BACKEND,
         'openai_configured': openai_configured,
         'endpoints': {
             'auth': '/api/auth/register, /api/auth/login',
             'mealplans': '/api/mealplans/generate, /api/mealplans/',
-            'dashboard': '/api/dashboard/summary'
-        }
+            'dashboard': '/api/dashboard/summary, /api/dashboard/bootstrap',
+            'admin': '/api/admin/analytics'
+        },
+        'concurrency': concurrency.controller.snapshot()
     })
 
 
-@app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors."""
     return jsonify({'error': 'Endpoint not found'}), 404
 
 
-@app.errorhandler(500)
 def internal_error(error):
     """Handle 500 errors."""
     return jsonify({'error': 'Internal server error'}), 500
 
 
+def warmup():
+    """
+    Build the lookup structures requests use before workers fork, so each
+    worker starts with them already in shared memory.
+    """
+    import plan_storage
+    from services import openai_service, search
+    # Fingerprint the catalog and build its recipe name index
+    openai_service.catalog_version()
+    openai_service.find_recipe("Breakfast", "")
+    search.get_recipe_index()
+    if plan_storage.PLAN_STORAGE != "full":
+        # Build the compression dictionary
+        plan_storage.pack_content({})
+
+
+app = create_app()
+
+
 if __name__ == '__main__':
     # Run on 0.0.0.0:8000 for backend (frontend will be on 5000)
     port = int(os.getenv('PORT', 8000))
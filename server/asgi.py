@@ -0,0 +1,335 @@
+"""
+Async (ASGI) entry point for the meal plan and dashboard routes.
+
+Generation is dominated by waiting on the model backend, so these routes
+run on an event loop instead of holding a thread per in-flight request.
+Other paths (auth) are forwarded to the Flask app through asgiref. The
+sync Flask server in app.py stays the default.
+
+Run with:
+    uvicorn asgi:app --workers 1 --loop uvloop
+
+Like gunicorn, startup fails if WEB_CONCURRENCY asks for more than one
+worker while the store is in memory.
+"""
+
+import asyncio
+import os
+import re
+from urllib.parse import parse_qs
+
+import concurrency
+import idempotency
+from app import app as flask_app, warmup
+from db import check_worker_config
+from routes.auth import authenticate
+from routes.dashboard import build_summary
+from routes.mealplans import (
+    check_owner, check_rate_limit, find_owned_record, generation_result, regenerate_part,
+    replay_generation, validate_generate_request, validate_plan_update, RATE_LIMIT_SECONDS
+)
+from serialization import dumps_bytes, encode_plan_response, loads
+from services import history, search
+from services.async_backends import AsyncMealPlanStore, AsyncModelClient
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:  # pragma: no cover - depends on the environment
+    WsgiToAsgi = None
+
+store = AsyncMealPlanStore()
+model_client = AsyncModelClient()
+
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-methods", b"GET, POST, PUT, DELETE, OPTIONS"),
+    (b"access-control-allow-headers", b"Content-Type, Authorization, Idempotency-Key"),
+]
+
+
+class Request:
+    """Minimal view of an ASGI HTTP request."""
+
+    def __init__(self, scope: dict, body: bytes):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1")
+                        for k, v in scope.get("headers", [])}
+        self.args = {k: v[-1] for k, v in parse_qs(scope.get("query_string", b"").decode("latin-1")).items()}
+        self.body = body
+
+    def get_json(self):
+        if not self.body:
+            return None
+        try:
+            return loads(self.body)
+        except ValueError:
+            return None
+
+
+def json_response(payload, status: int = 200):
+    """Build a (status, body) pair from a JSON-serializable payload."""
+    return status, dumps_bytes(payload)
+
+
+async def run_generation(current_user, params: dict):
+    """Rate-limit, generate and store a plan; returns (payload, status)."""
+    if not check_rate_limit(current_user['id']):
+        return {
+            'error': f'Rate limit exceeded. Please wait {RATE_LIMIT_SECONDS} seconds between requests.'
+        }, 429
+
+    try:
+        plan_content = await model_client.generate(
+            params['days'], params['preferences'],
+            params['servings'], params['target_calories'],
+            variety=params['variety'],
+            recent_recipes=history.recent_counts(current_user['id']) if params['variety'] else None
+        )
+    except Exception as e:
+        return {
+            'error': 'Failed to generate meal plan',
+            'details': str(e)
+        }, 500
+
+    meal_plan = await store.create(current_user['id'], {**params, 'plan_content': plan_content})
+    return {
+        'message': 'Meal plan generated successfully',
+        'meal_plan': meal_plan
+    }, 201
+
+
+async def generate(request, current_user):
+    """Async counterpart of POST /api/mealplans/generate."""
+    params, error = validate_generate_request(request.get_json())
+    if error:
+        return json_response({'error': error}, 400)
+
+    key = request.headers.get(idempotency.HEADER.lower())
+    if key is None:
+        payload, status = await run_generation(current_user, params)
+        return json_response(payload, status)
+
+    error = idempotency.validate_key(key)
+    if error:
+        return json_response({'error': error}, 400)
+
+    try:
+        future, owner = idempotency.store.begin(
+            current_user['id'], key, idempotency.fingerprint(params)
+        )
+    except idempotency.IdempotencyConflict as e:
+        return json_response({'error': str(e)}, 422)
+
+    if not owner:
+        # Wait on the original request without blocking the event loop;
+        # shield it so a timeout here does not cancel it for other waiters
+        try:
+            status, result = await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)), idempotency.IDEMPOTENCY_WAIT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            return json_response({
+                'error': f'A request with this {idempotency.HEADER} is still in progress'
+            }, 409)
+        # Loading the plan can thaw or decompress it
+        payload, status = await asyncio.to_thread(replay_generation, status, result)
+        status, body = json_response(payload, status)
+        return status, body, [(idempotency.REPLAYED_HEADER.lower().encode(), b"true")]
+
+    status, result = 500, {'error': 'Generation failed'}
+    try:
+        payload, status = await run_generation(current_user, params)
+        result = generation_result(payload, status)
+    finally:
+        idempotency.store.finish(current_user['id'], key, status, result)
+    return json_response(payload, status)
+
+
+async def search_plans(request, current_user):
+    """Async counterpart of GET /api/mealplans/search."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return json_response({'error': 'Query parameter q is required'}, 400)
+
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        limit = 20
+    if limit < 1 or limit > 100:
+        return json_response({'error': 'Limit must be between 1 and 100'}, 400)
+
+    return json_response({'query': query, **search.search(current_user['id'], query, limit)})
+
+
+async def get_all(request, current_user):
+    """Async counterpart of GET /api/mealplans/."""
+    plans = await store.find_by_user(current_user['id'])
+    return json_response({'meal_plans': plans})
+
+
+async def plan_detail(request, current_user, plan_id):
+    """Async counterpart of GET/PUT/DELETE /api/mealplans/<plan_id>."""
+    if request.method == 'DELETE':
+        error, status = check_owner(plan_id, current_user['id'])
+        if error:
+            return json_response({'error': error}, status)
+        await store.delete(plan_id)
+        return json_response({'message': 'Meal plan deleted successfully'})
+
+    # Loading can thaw a cold plan and encoding can decompress or rebuild it
+    plan, error, status = await asyncio.to_thread(find_owned_record, plan_id, current_user['id'])
+    if error:
+        return json_response({'error': error}, status)
+
+    if request.method == 'GET':
+        return 200, await asyncio.to_thread(encode_plan_response, plan)
+
+    data = request.get_json()
+    error = validate_plan_update(plan, data)
+    if error:
+        return json_response({'error': error}, 400)
+
+    updated_plan = await store.update(plan_id, data)
+    return json_response({
+        'message': 'Meal plan updated successfully',
+        'meal_plan': updated_plan
+    })
+
+
+async def regenerate(request, current_user, plan_id):
+    """Async counterpart of POST /api/mealplans/<plan_id>/regenerate."""
+    plan, error, status = await asyncio.to_thread(find_owned_record, plan_id, current_user['id'])
+    if error:
+        return json_response({'error': error}, status)
+
+    # Takes the plan's lock and waits for the log fsync
+    new_day, error, status = await asyncio.to_thread(regenerate_part, plan, request.get_json())
+    if error:
+        return json_response({'error': error}, status)
+
+    return json_response({
+        'message': 'Meal plan updated successfully',
+        'plan_id': plan_id,
+        'day': new_day
+    })
+
+
+async def summary(request, current_user):
+    """Async counterpart of GET /api/dashboard/summary."""
+    return json_response(await asyncio.to_thread(build_summary, current_user))
+
+
+# (method set, path pattern, handler)
+ROUTES = [
+    ({'POST'}, re.compile(r'^/api/mealplans/generate$'), generate),
+    ({'GET'}, re.compile(r'^/api/mealplans/?$'), get_all),
+    ({'GET'}, re.compile(r'^/api/mealplans/search$'), search_plans),
+    ({'GET', 'PUT', 'DELETE'}, re.compile(r'^/api/mealplans/(?P<plan_id>[^/]+)$'), plan_detail),
+    ({'POST'}, re.compile(r'^/api/mealplans/(?P<plan_id>[^/]+)/regenerate$'), regenerate),
+    ({'GET'}, re.compile(r'^/api/dashboard/summary$'), summary),
+]
+
+
+def match_route(method: str, path: str):
+    """Return (handler, path params) for a request, or (None, None)."""
+    for methods, pattern, handler in ROUTES:
+        match = pattern.match(path)
+        if match:
+            if method not in methods:
+                return None, None
+            return handler, match.groupdict()
+    return None, None
+
+
+async def read_body(receive) -> bytes:
+    """Read the full request body from the ASGI receive channel."""
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+    return b"".join(chunks)
+
+
+async def send_response(send, status: int, body: bytes, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *CORS_HEADERS,
+            *headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+fallback_app = WsgiToAsgi(flask_app) if WsgiToAsgi is not None else None
+
+
+async def app(scope, receive, send):
+    """ASGI application."""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    # uvicorn also reads WEB_CONCURRENCY as its --workers default
+                    check_worker_config(int(os.getenv('WEB_CONCURRENCY', 1)))
+                except RuntimeError as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                warmup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await model_client.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] != "http":
+        return
+
+    method, path = scope["method"], scope["path"]
+    if method == "OPTIONS" and path.startswith("/api/"):
+        await send_response(send, 200, b"")
+        return
+
+    handler, path_params = match_route(method, path)
+    if handler is None:
+        if fallback_app is not None:
+            await fallback_app(scope, receive, send)
+        else:
+            await send_response(send, *json_response({'error': 'Endpoint not found'}, 404))
+        return
+
+    endpoint = f"asgi.{handler.__name__}"
+    priority = concurrency.classify(endpoint, method)
+    controller = concurrency.asgi_controller
+    token = controller.try_acquire(endpoint, priority) if concurrency.CONCURRENCY_LIMITS else None
+    if concurrency.CONCURRENCY_LIMITS and token is None:
+        retry_after = str(controller.retry_after(endpoint)).encode()
+        await send_response(send, *json_response({'error': 'Server is busy, please retry shortly'}, 503),
+                            headers=[(b"retry-after", retry_after)])
+        return
+
+    status = 500
+    headers = ()
+    try:
+        request = Request(scope, await read_body(receive))
+        current_user, error = authenticate(request.headers.get('authorization'))
+        if error:
+            status, body = json_response({'error': error}, 401)
+        else:
+            try:
+                # Handlers return (status, body) or (status, body, extra headers)
+                status, body, *extra = await handler(request, current_user, **path_params)
+                headers = extra[0] if extra else ()
+            except Exception as e:
+                status, body = json_response({'error': str(e)}, 500)
+        await send_response(send, status, body, headers)
+    finally:
+        if token is not None:
+            controller.release(endpoint, priority, token, status < 500)
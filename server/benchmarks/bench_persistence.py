@@ -0,0 +1,115 @@
+"""
+Benchmark the operation log: write throughput with group commit and
+recovery time from log replay and from a snapshot.
+
+Run from the server directory:
+    python -m benchmarks.bench_persistence --plans 1000000 --threads 32
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models  # noqa: E402
+import persistence  # noqa: E402
+from models import MealPlan  # noqa: E402
+from serialization import dumps_bytes, loads  # noqa: E402
+from services.openai_service import generate_meal_plan  # noqa: E402
+
+
+def reset_store():
+    models.users_db.clear()
+    models.meal_plans_db.clear()
+    models.user_id_counter["value"] = 1
+    models.meal_plan_id_counter["value"] = 1
+
+
+def write_plans(total: int, threads: int, days: int):
+    """Create `total` plans from `threads` concurrent writers."""
+    encoded_content = dumps_bytes(generate_meal_plan(days=days))
+    per_thread = total // threads
+
+    def writer(user_id):
+        for _ in range(per_thread):
+            MealPlan.create(user_id, {
+                "days": days,
+                "preferences": "",
+                "servings": 2,
+                "target_calories": 2000,
+                # Each plan gets its own objects, as when decoded from a
+                # request; shared ones would be pickled once per snapshot
+                "plan_content": loads(encoded_content)
+            })
+
+    workers = [threading.Thread(target=writer, args=(str(i),)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return per_thread * threads, time.perf_counter() - start
+
+
+def timed_recover(directory: str):
+    reset_store()
+    start = time.perf_counter()
+    replayed = persistence.recover(directory, models.load_state, models.apply_op)
+    return replayed, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--plans", type=int, default=1_000_000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--days", type=int, default=1, help="days per generated plan")
+    parser.add_argument("--dir", help="data directory (default: a temp dir)")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="mealplanner-wal-")
+    try:
+        reset_store()
+        persistence.oplog = persistence.OperationLog(
+            directory, models.dump_state, snapshot_every=args.plans * 2
+        )
+        written, elapsed = write_plans(args.plans, args.threads, args.days)
+        log_size = os.path.getsize(persistence.oplog.log_path)
+        print(f"write:    {written:,} plans in {elapsed:.2f}s "
+              f"({written / elapsed:,.0f} plans/s, {log_size / 1e6:,.1f} MB log)")
+
+        start = time.perf_counter()
+        persistence.oplog.snapshot()
+        snapshot_size = os.path.getsize(persistence.oplog.snapshot_path)
+        print(f"snapshot: {time.perf_counter() - start:.2f}s ({snapshot_size / 1e6:,.1f} MB)")
+        persistence.oplog.close()
+        persistence.oplog = None
+
+        # Replay the full log without the snapshot
+        snapshot_path = os.path.join(directory, persistence.SNAPSHOT_FILE)
+        os.rename(snapshot_path, snapshot_path + ".bak")
+        with open(os.path.join(directory, persistence.LOG_FILE), "wb"):
+            pass
+        reset_store()
+        persistence.oplog = persistence.OperationLog(directory, models.dump_state)
+        write_plans(args.plans, args.threads, args.days)
+        persistence.oplog.close()
+        persistence.oplog = None
+        replayed, elapsed = timed_recover(directory)
+        print(f"recover from log:      {replayed:,} records in {elapsed:.2f}s")
+
+        os.remove(os.path.join(directory, persistence.LOG_FILE))
+        os.rename(snapshot_path + ".bak", snapshot_path)
+        _, elapsed = timed_recover(directory)
+        print(f"recover from snapshot: {len(models.meal_plans_db):,} plans in {elapsed:.2f}s")
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark compact plan storage: resident memory per stored plan and
+decode cost, comparing full Python objects with compressed blobs.
+
+Run from the server directory:
+    python -m benchmarks.bench_plan_storage --plans 10000 --days 7
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plan_storage  # noqa: E402
+from services.openai_service import generate_meal_plan  # noqa: E402
+
+
+def measure(build):
+    """Return (result, bytes allocated) for build()."""
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--plans", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=7)
+    args = parser.parse_args()
+
+    codec = plan_storage._get_codec()
+    print(f"codec: {'zstd' if codec.codec == plan_storage.CODEC_ZSTD else 'zlib'}, "
+          f"dictionary: {len(codec.dictionary):,} bytes")
+
+    # Generated plans share recipe strings with the catalog; round-trip
+    # through JSON so each stored plan owns its objects like a real request.
+    plans = [plan_storage.pack_content(generate_meal_plan(days=args.days))
+             for _ in range(args.plans)]
+
+    full, full_size = measure(lambda: [plan_storage.unpack_content(blob) for blob in plans])
+    del full
+    blobs, blob_size = measure(lambda: [bytes(bytearray(blob)) for blob in plans])
+
+    print(f"full:       {full_size / args.plans / 1024:8.1f} KB/plan")
+    print(f"compressed: {blob_size / args.plans / 1024:8.1f} KB/plan "
+          f"({full_size / blob_size:.1f}x smaller)")
+
+    start = time.perf_counter()
+    for blob in blobs:
+        plan_storage.unpack_encoded(blob)
+    elapsed = time.perf_counter() - start
+    print(f"decode to JSON bytes:   {elapsed / args.plans * 1e6:8.1f} us/plan")
+
+    start = time.perf_counter()
+    for blob in blobs:
+        plan_storage.unpack_content(blob)
+    elapsed = time.perf_counter() - start
+    print(f"decode to Python dict:  {elapsed / args.plans * 1e6:8.1f} us/plan")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Offline bulk meal plan generation.
+
+Reads rows of (days, preferences, servings, target_calories) from a CSV
+file with a header line and generates one plan per row on a process pool.
+Rows are read lazily and submitted in chunks with a bounded number of
+chunks in flight, so memory stays flat however long the input is. Results
+are written in input order, either as NDJSON or straight into the store
+as one logged batch per chunk.
+
+Run from the server directory:
+    python -m bulk_generate cohort.csv --output plans.ndjson
+    DATA_DIR=data python -m bulk_generate cohort.csv --store --user-id 7
+
+Store mode writes to the DATA_DIR operation log, so stop the server first.
+"""
+
+import argparse
+import csv
+import hashlib
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from serialization import dumps_bytes
+from services.openai_service import generate_meal_plan
+
+# Columns read from each row; missing or empty ones use the API defaults
+COLUMNS = ("days", "preferences", "servings", "target_calories")
+INT_COLUMNS = ("days", "servings", "target_calories")
+
+
+def row_seed(base_seed: int, row_number: int) -> int:
+    """Seed for one row, stable for a given base seed."""
+    digest = hashlib.blake2b(f"{base_seed}:{row_number}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1
+
+
+def parse_row(row: dict) -> dict:
+    """Convert a CSV row into a generation request body."""
+    data = {}
+    for column in COLUMNS:
+        value = (row.get(column) or "").strip()
+        if not value:
+            continue
+        data[column] = int(value) if column in INT_COLUMNS else value
+    return data
+
+
+def read_requests(path: str, validate, skipped: dict):
+    """
+    Yield (row number, params) for valid rows. Invalid rows are reported
+    on stderr and counted in skipped["value"].
+    """
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            try:
+                params, error = validate(parse_row(row))
+            except ValueError as e:
+                params, error = None, str(e)
+            if error:
+                skipped["value"] += 1
+                print(f"line {reader.line_num}: {error}", file=sys.stderr)
+                continue
+            yield reader.line_num, params
+
+
+def generate_chunk(chunk, base_seed, encode):
+    """
+    Worker task: generate plans for a chunk of (row number, params).
+    Returns NDJSON bytes when encode is set, else (params, plan_content) pairs.
+    """
+    results = []
+    for row_number, params in chunk:
+        seed = row_seed(base_seed, row_number) if base_seed is not None else None
+        plan_content = generate_meal_plan(
+            params["days"], params["preferences"], params["servings"],
+            params["target_calories"], seed=seed
+        )
+        if encode:
+            results.append(dumps_bytes({"row": row_number, **params, "plan_content": plan_content}))
+        else:
+            results.append((params, plan_content))
+    if encode:
+        return b"".join(line + b"\n" for line in results)
+    return results
+
+
+def chunks(iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run(requests, workers: int, chunk_size: int, max_pending: int, base_seed, encode,
+        handle_result, report_every: float):
+    """
+    Fan chunks out to a process pool and hand results to handle_result in
+    input order. Returns the number of plans generated.
+    """
+    # spawn keeps workers from inheriting the store and its log thread
+    context = multiprocessing.get_context("spawn")
+    pending = deque()
+    done = 0
+    start = last_report = time.perf_counter()
+
+    def collect():
+        nonlocal done, last_report
+        chunk_length, future = pending.popleft()
+        handle_result(future.result())
+        done += chunk_length
+        now = time.perf_counter()
+        if now - last_report >= report_every:
+            last_report = now
+            print(f"{done:,} plans, {done / (now - start):,.0f} plans/s", file=sys.stderr)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        for chunk in chunks(requests, chunk_size):
+            if len(pending) >= max_pending:
+                collect()
+            pending.append((len(chunk), executor.submit(generate_chunk, chunk, base_seed, encode)))
+        while pending:
+            collect()
+    return done
+
+
+def open_store(user_id: str):
+    """Recover the persistent store and return a handler that bulk-inserts plans."""
+    import models
+    import persistence
+
+    if not persistence.DATA_DIR:
+        sys.exit("--store needs DATA_DIR; without it the plans would be lost on exit")
+    persistence.open_log(persistence.DATA_DIR, models.dump_state, models.load_state, models.apply_op)
+    if user_id not in models.users_db:
+        sys.exit(f"User {user_id} does not exist")
+
+    def insert(results):
+        models.MealPlan.create_many(user_id, [
+            {**params, "plan_content": plan_content} for params, plan_content in results
+        ])
+    return insert
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate meal plans in bulk from a CSV file")
+    parser.add_argument("input", help="CSV file with a header of days,preferences,servings,target_calories")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--output", help="NDJSON output file ('-' for stdout)")
+    target.add_argument("--store", action="store_true", help="insert plans into the DATA_DIR store")
+    parser.add_argument("--user-id", help="owner of the stored plans (with --store)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=256, help="rows per worker task")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="chunks in flight (default: 2 per worker)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="base seed; makes the output reproducible")
+    parser.add_argument("--report-every", type=float, default=5.0, help="seconds between progress lines")
+    args = parser.parse_args()
+
+    if args.store and not args.user_id:
+        parser.error("--store requires --user-id")
+    if args.workers < 1 or args.chunk_size < 1:
+        parser.error("--workers and --chunk-size must be positive")
+    max_pending = args.max_pending or 2 * args.workers
+
+    from routes.mealplans import validate_generate_request
+
+    skipped = {"value": 0}
+    requests = read_requests(args.input, validate_generate_request, skipped)
+    start = time.perf_counter()
+
+    if args.store:
+        insert = open_store(args.user_id)
+        done = run(requests, args.workers, args.chunk_size, max_pending, args.seed, False,
+                   insert, args.report_every)
+        # Fold the bulk load into a snapshot so the next start does not replay it
+        import persistence
+        persistence.oplog.snapshot()
+    else:
+        output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+        try:
+            done = run(requests, args.workers, args.chunk_size, max_pending, args.seed, True,
+                       output.write, args.report_every)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Generated {done:,} plans in {elapsed:.1f}s ({done / max(elapsed, 1e-9):,.0f} plans/s); "
+          f"{skipped['value']:,} rows skipped", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Tiered retention for meal plans.
+
+Reads record when each plan was last accessed. A background sweeper moves
+plans idle for PLAN_IDLE_SECONDS out of meal_plans_db into a compressed
+on-disk cold store, leaving only a small stub with the fields that plan
+lists and indexes use. Reading a cold plan faults it back in. With
+PLAN_EXPIRE_SECONDS set, cold plans idle that long are deleted.
+
+Enabled by setting COLD_STORE_DIR. Moves between tiers are written to the
+operation log like any other store change, so DATA_DIR is required.
+"""
+
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from plan_storage import BLOB_KEY, pack_content
+
+COLD_STORE_DIR = os.getenv('COLD_STORE_DIR')
+PLAN_IDLE_SECONDS = float(os.getenv('PLAN_IDLE_SECONDS', 7 * 24 * 3600))
+# 0 keeps cold plans forever
+PLAN_EXPIRE_SECONDS = float(os.getenv('PLAN_EXPIRE_SECONDS', 0))
+TIER_SWEEP_SECONDS = float(os.getenv('TIER_SWEEP_SECONDS', 300))
+
+# Hot plan ID -> wall-clock time of its last access
+last_access: Dict[str, float] = {}
+
+# Serializes moves between tiers
+lock = threading.RLock()
+
+
+def touch(plan_id: str):
+    """Record an access to a hot plan."""
+    if COLD_STORE_DIR:
+        last_access[plan_id] = time.time()
+
+
+def _path(plan_id: str) -> Path:
+    # Spread files over 256 directories
+    return Path(COLD_STORE_DIR) / f"{int(plan_id) % 256:02x}" / f"{plan_id}.plan"
+
+
+def encode(record: dict) -> bytes:
+    """Serialize a stored record with its content compressed."""
+    if "plan_content" in record:
+        content = record["plan_content"]
+        record = {k: v for k, v in record.items() if k != "plan_content"}
+        record[BLOB_KEY] = pack_content(content)
+    return pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode(data: bytes) -> dict:
+    return pickle.loads(data)
+
+
+def write(plan_id: str, data: bytes):
+    """Durably write a plan's cold copy."""
+    path = _path(plan_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read(plan_id: str) -> bytes:
+    with open(_path(plan_id), 'rb') as f:
+        return f.read()
+
+
+def remove(plan_id: str):
+    """Delete a plan's cold copy if there is one."""
+    if COLD_STORE_DIR:
+        try:
+            os.unlink(_path(plan_id))
+        except FileNotFoundError:
+            pass
+
+
+def sweep(now: Optional[float] = None) -> Tuple[int, int]:
+    """
+    Freeze idle hot plans and delete expired cold plans.
+    Returns (frozen, expired).
+    """
+    from models import MealPlan, cold_plans, meal_plans_db
+
+    now = time.time() if now is None else now
+    idle_since = now - PLAN_IDLE_SECONDS
+    frozen = expired = 0
+    for plan_id in list(meal_plans_db):
+        # Plans loaded at startup count as accessed at the first sweep
+        if last_access.setdefault(plan_id, now) <= idle_since:
+            # freeze() checks again under the lock, in case a read came in since
+            frozen += MealPlan.freeze(plan_id, idle_since)
+    if PLAN_EXPIRE_SECONDS:
+        for plan_id, stub in list(cold_plans.items()):
+            if now - stub["last_access"] >= PLAN_EXPIRE_SECONDS:
+                expired += MealPlan.delete(plan_id)
+    return frozen, expired
+
+
+class Sweeper:
+    """Background thread running sweep() every TIER_SWEEP_SECONDS."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._start()
+        # Threads do not survive gunicorn's fork after preloading the app
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='cold-store-sweeper', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                sweep()
+            except Exception as e:
+                print(f"Cold store sweep failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+
+sweeper: Optional[Sweeper] = None
+
+
+def check_config():
+    """
+    Refuse a cold store without DATA_DIR: the in-memory stubs would be
+    lost on restart while the cold files stay behind.
+    """
+    import persistence
+
+    if COLD_STORE_DIR and not persistence.DATA_DIR:
+        raise RuntimeError(
+            "COLD_STORE_DIR requires DATA_DIR: without the operation log the "
+            "cold plans would be lost on restart and their files orphaned."
+        )
+
+
+def start_sweeper():
+    """Start the sweeper if the cold store is enabled."""
+    global sweeper
+    check_config()
+    if COLD_STORE_DIR and sweeper is None and TIER_SWEEP_SECONDS > 0:
+        sweeper = Sweeper(TIER_SWEEP_SECONDS)
@@ -0,0 +1,209 @@
+"""
+Adaptive concurrency limits and load shedding.
+
+Each endpoint has its own limit on requests in flight. The limit adapts
+to observed latency (AIMD): it grows by about one per limit's worth of
+fast responses while the endpoint is actually using it, and shrinks by
+10% when latency rises well above the endpoint's best recent latency or
+responses fail. A request over the limit is rejected at once with 503
+and Retry-After instead of waiting for a thread.
+
+Endpoints also belong to a priority class. A class is only admitted
+while the server's total in-flight count is below its share of
+CONCURRENCY_CAPACITY (the worker's threads), so slow generation can
+never occupy the threads that cheap reads and health checks need. The
+ASGI app's own routes use a separate controller sized by
+ASGI_CONCURRENCY_CAPACITY, since waiting requests there cost no thread.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+CONCURRENCY_CAPACITY = int(os.getenv(
+    'CONCURRENCY_CAPACITY', os.getenv('GUNICORN_THREADS', (os.cpu_count() or 1) * 4)
+))
+CONCURRENCY_LIMITS = os.getenv('CONCURRENCY_LIMITS', 'on') != 'off'
+# The ASGI app does not hold a thread per request, so its capacity is
+# independent of the gunicorn thread count
+ASGI_CONCURRENCY_CAPACITY = int(os.getenv('ASGI_CONCURRENCY_CAPACITY', 512))
+
+# Priority classes, highest first
+CRITICAL = 'critical'
+READ = 'read'
+WRITE = 'write'
+GENERATE = 'generate'
+
+# Share of capacity that may be in flight when a class is admitted;
+# critical requests are never limited
+CLASS_SHARES = {READ: 1.0, WRITE: 0.75, GENERATE: 0.5}
+
+CRITICAL_ENDPOINTS = {'index', 'health'}
+GENERATE_ENDPOINTS = {
+    'mealplans.generate', 'mealplans.regenerate',
+    'asgi.generate', 'asgi.regenerate',
+}
+
+
+def classify(endpoint: str, method: str) -> str:
+    """Priority class of a request."""
+    if endpoint in CRITICAL_ENDPOINTS:
+        return CRITICAL
+    if endpoint in GENERATE_ENDPOINTS:
+        return GENERATE
+    return READ if method in ('GET', 'HEAD') else WRITE
+
+
+class AdaptiveLimit:
+    """AIMD limit on one endpoint's in-flight requests."""
+
+    BACKOFF = 0.9
+    # Latency above baseline * TOLERANCE (and above MIN_CONGESTION) is congestion
+    TOLERANCE = 2.0
+    MIN_CONGESTION = 0.05
+    # Lets the baseline drift up so it recovers after a lucky fast sample
+    BASELINE_DRIFT = 1.001
+    LATENCY_ALPHA = 0.2
+
+    def __init__(self, initial: float, min_limit: float, max_limit: float):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.inflight = 0
+        self.baseline: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.rejected = 0
+        self._last_decrease = 0.0
+
+    def sample(self, latency: float, ok: bool, inflight: int, now: float):
+        """Adjust the limit after a request that saw `inflight` requests at admission."""
+        if self.baseline is None:
+            self.baseline = self.latency = latency
+        else:
+            self.baseline = min(latency, self.baseline * self.BASELINE_DRIFT)
+            self.latency += self.LATENCY_ALPHA * (latency - self.latency)
+
+        congested = latency > max(self.baseline * self.TOLERANCE, self.MIN_CONGESTION)
+        if not ok or congested:
+            # At most one decrease per round trip, so one slow burst counts once
+            if now - self._last_decrease >= self.latency:
+                self.limit = max(self.min_limit, self.limit * self.BACKOFF)
+                self._last_decrease = now
+        elif inflight * 2 >= self.limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+
+class ConcurrencyController:
+    """Admission control across endpoints and priority classes."""
+
+    def __init__(self, capacity: int = CONCURRENCY_CAPACITY):
+        self.capacity = capacity
+        self.inflight = 0
+        self.class_inflight = Counter()
+        self.limits: Dict[str, AdaptiveLimit] = {}
+        self._lock = threading.Lock()
+
+    def _limit_for(self, endpoint: str, priority: str) -> AdaptiveLimit:
+        limit = self.limits.get(endpoint)
+        if limit is None:
+            max_limit = max(1.0, self.capacity * CLASS_SHARES[priority])
+            limit = self.limits[endpoint] = AdaptiveLimit(max_limit / 2, 1.0, max_limit)
+        return limit
+
+    def try_acquire(self, endpoint: str, priority: str) -> Optional[Tuple[float, int]]:
+        """
+        Admit a request, returning a token for release(), or None if it
+        should be shed.
+        """
+        with self._lock:
+            limit = self._limit_for(endpoint, priority)
+            if (limit.inflight >= limit.limit
+                    or self.inflight >= self.capacity * CLASS_SHARES[priority]):
+                limit.rejected += 1
+                return None
+            limit.inflight += 1
+            self.inflight += 1
+            self.class_inflight[priority] += 1
+            return time.monotonic(), limit.inflight
+
+    def release(self, endpoint: str, priority: str, token: Tuple[float, int], ok: bool):
+        """Finish an admitted request and feed its latency to the limit."""
+        started, inflight = token
+        now = time.monotonic()
+        with self._lock:
+            limit = self.limits[endpoint]
+            limit.inflight -= 1
+            self.inflight -= 1
+            self.class_inflight[priority] -= 1
+            limit.sample(now - started, ok, inflight, now)
+
+    def retry_after(self, endpoint: str) -> int:
+        """Seconds a shed client should wait, from the endpoint's latency."""
+        limit = self.limits.get(endpoint)
+        if limit is None or limit.latency is None:
+            return 1
+        return max(1, math.ceil(limit.latency))
+
+    def snapshot(self) -> dict:
+        """Limiter state for the health endpoint."""
+        with self._lock:
+            return {
+                'capacity': self.capacity,
+                'inflight': self.inflight,
+                'inflight_by_class': {name: count for name, count in self.class_inflight.items() if count},
+                'endpoints': {
+                    endpoint: {
+                        'limit': round(limit.limit, 2),
+                        'inflight': limit.inflight,
+                        'latency_ms': round(limit.latency * 1000, 1) if limit.latency is not None else None,
+                        'baseline_ms': round(limit.baseline * 1000, 1) if limit.baseline is not None else None,
+                        'rejected': limit.rejected
+                    }
+                    for endpoint, limit in sorted(self.limits.items())
+                }
+            }
+
+
+controller = ConcurrencyController()
+# Limits for the routes asgi.py serves itself
+asgi_controller = ConcurrencyController(ASGI_CONCURRENCY_CAPACITY)
+
+
+def init_app(app):
+    """Apply the limits to every request of a Flask app."""
+    if not CONCURRENCY_LIMITS:
+        return
+
+    from flask import g, jsonify, request
+
+    @app.before_request
+    def admit():
+        endpoint = request.endpoint
+        if endpoint is None or request.method == 'OPTIONS':
+            return None
+        priority = classify(endpoint, request.method)
+        if priority == CRITICAL:
+            return None
+        token = controller.try_acquire(endpoint, priority)
+        if token is None:
+            response = jsonify({'error': 'Server is busy, please retry shortly'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(controller.retry_after(endpoint))
+            return response
+        g.concurrency = (endpoint, priority, token)
+        return None
+
+    @app.after_request
+    def record_status(response):
+        g.concurrency_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def release(error):
+        admitted = g.pop('concurrency', None)
+        if admitted is not None:
+            ok = error is None and g.get('concurrency_status', 500) < 500
+            controller.release(*admitted, ok)
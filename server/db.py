@@ -3,13 +3,42 @@ Database initialization and management.
 Currently uses in-memory storage. Can be migrated to SQLite or PostgreSQL.
 """
 
-from models import users_db, meal_plans_db
+import os
+
+import persistence
+from models import users_db, meal_plans_db, cold_plans
+
+# Storage backend name; only the in-memory store exists today
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'in-memory')
+STORAGE_BACKENDS = ('in-memory',)
+
+
+def check_config():
+    """
+    Refuse a STORAGE_BACKEND this build has no implementation for. It
+    would still run on the in-memory store, skip the worker check and
+    report the wrong backend in /api/health.
+    """
+    if STORAGE_BACKEND not in STORAGE_BACKENDS:
+        raise RuntimeError(
+            f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r}; "
+            f"available: {', '.join(STORAGE_BACKENDS)}."
+        )
 
 
 def init_db():
     """Initialize the database with test data."""
     from models import User
     from passlib.hash import bcrypt
+    import models
+    
+    # Recover persisted data before seeding anything
+    if persistence.DATA_DIR and persistence.oplog is None:
+        replayed = persistence.open_log(
+            persistence.DATA_DIR, models.dump_state, models.load_state, models.apply_op
+        )
+        print(f"✓ Recovered {len(users_db)} users and {len(meal_plans_db) + len(cold_plans)} meal plans "
+              f"({replayed} log records replayed)")
     
     # Create a test user if database is empty
     if not users_db:
@@ -25,5 +54,19 @@ def get_db_stats():
     """Get database statistics for dashboard."""
     return {
         "total_users": len(users_db),
-        "total_meal_plans": len(meal_plans_db)
+        "total_meal_plans": len(meal_plans_db) + len(cold_plans),
+        "cold_meal_plans": len(cold_plans)
     }
+
+
+def check_worker_config(workers: int):
+    """
+    Refuse multi-process deployments on process-local storage.
+    Each worker would hold its own users_db/meal_plans_db and rate limit state.
+    """
+    if STORAGE_BACKEND == 'in-memory' and workers > 1:
+        raise RuntimeError(
+            f"Cannot run {workers} workers with the in-memory store: each worker "
+            "would see different users and meal plans. Use workers = 1 and scale "
+            "with threads, or configure a shared STORAGE_BACKEND."
+        )
@@ -0,0 +1,54 @@
+"""
+Gunicorn configuration for production deployments.
+Values can be overridden with environment variables.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# All state lives in process memory, so default to one worker and
+# serve concurrency with threads. on_starting rejects workers > 1.
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', multiprocessing.cpu_count() * 4))
+
+# Import the app, recipe catalog and routes once in the master before
+# forking. The store is not opened there: threads such as the operation
+# log flusher do not survive fork, so each worker recovers it in post_fork.
+preload_app = True
+raw_env = ['DEFER_STORE_START=1']
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+backlog = 2048
+
+# Worker recycling would wipe the in-memory store, so leave max_requests off
+max_requests = 0
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    """
+    Validate the worker setup against the storage backend. This runs after
+    the app is preloaded but before any worker opens the store.
+    """
+    from db import check_worker_config
+
+    try:
+        check_worker_config(server.cfg.workers)
+    except RuntimeError as e:
+        server.log.error(str(e))
+        raise SystemExit(1)
+
+
+def post_fork(server, worker):
+    """Recover the store and open the operation log in the worker."""
+    from app import start_store
+
+    start_store()
@@ -0,0 +1,127 @@
+"""
+Idempotency keys for requests that create data.
+
+A client sends the same Idempotency-Key header when it retries a request.
+The first request with a key runs normally; its status and a small result
+(the created plan's ID, not the encoded response) are kept for
+IDEMPOTENCY_TTL_SECONDS, and later requests with that key rebuild the
+response from them. Requests that arrive while the first one is still
+running wait on the same in-flight result instead of starting their own.
+
+Keys are scoped per user and live in process memory, like the rest of the
+in-memory store.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional, Tuple
+
+from serialization import dumps_bytes
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv('IDEMPOTENCY_TTL_SECONDS', 3600))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv('IDEMPOTENCY_MAX_KEYS', 100000))
+# How long a retry waits for the original request before giving up
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', 120))
+MAX_KEY_LENGTH = 255
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used with a different request body."""
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "future", "expires_at")
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        # Resolves to (status, result)
+        self.future: Future = Future()
+        # None while the request is in flight
+        self.expires_at: Optional[float] = None
+
+
+def fingerprint(params: dict) -> str:
+    """Stable digest of validated request parameters."""
+    return hashlib.blake2b(dumps_bytes(sorted(params.items())), digest_size=16).hexdigest()
+
+
+def validate_key(key: str) -> Optional[str]:
+    """Return an error message for a malformed key, or None."""
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'
+    return None
+
+
+class IdempotencyStore:
+    """In-flight and completed responses by (user ID, key), oldest first."""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL_SECONDS, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, user_id: str, key: str, request_fingerprint: str) -> Tuple[Future, bool]:
+        """
+        Claim a key. Returns (future, True) if the caller should run the
+        request and then call finish(), or (future, False) if another
+        request owns the key and the caller should wait on the future.
+        Raises IdempotencyConflict if the key was used for a different body.
+        """
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.get((user_id, key))
+            if entry is not None:
+                if entry.fingerprint != request_fingerprint:
+                    raise IdempotencyConflict(f'{HEADER} was already used with a different request')
+                return entry.future, False
+            entry = _Entry(request_fingerprint)
+            self._entries[(user_id, key)] = entry
+            return entry.future, True
+
+    def finish(self, user_id: str, key: str, status: int, result):
+        """
+        Publish the owner's result to waiting requests. Keep the result
+        small, such as the ID of what was created: successful results are
+        kept for replay, failures are dropped so a retry runs again.
+        """
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is None:
+                return
+            if 200 <= status < 300:
+                entry.expires_at = time.monotonic() + self.ttl
+                self._entries.move_to_end((user_id, key))
+            else:
+                del self._entries[(user_id, key)]
+        entry.future.set_result((status, result))
+
+    def _expire(self, now: float):
+        # Completed entries are moved to the end in expiry order, so stop at
+        # the first one that is still live once the store is within
+        # max_keys. In-flight entries are skipped, never evicted.
+        excess = len(self._entries) - self.max_keys
+        evict = []
+        for entry_key, entry in self._entries.items():
+            if entry.expires_at is None:
+                continue
+            if entry.expires_at > now and excess <= 0:
+                break
+            evict.append(entry_key)
+            excess -= 1
+        for entry_key in evict:
+            del self._entries[entry_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+store = IdempotencyStore()
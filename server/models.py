@@ -3,17 +3,206 @@ Data models for the Meal Planner application.
 Uses in-memory storage for MVP (can be migrated to SQLite/PostgreSQL later).
 """
 
+import secrets
+import threading
+import time
+from collections import defaultdict
 from datetime import datetime
 from typing import Dict, List, Optional
 
+import cold_store
+import persistence
+from plan_storage import (
+    BLOB_KEY, PlanUnavailable, materialize, pack_content, rebuild_content, to_record
+)
+from serialization import invalidate_plan
+from services import analytics, history, search
+
 # In-memory storage
 users_db: Dict[str, dict] = {}
 meal_plans_db: Dict[str, dict] = {}
+# Plans moved to the cold store: plan ID -> stub of the fields plan lists
+# and indexes need, plus last_access
+cold_plans: Dict[str, dict] = {}
+
+# Plan IDs per user in creation order, and a per-user counter bumped on
+# every change to that user's plans (used for dashboard ETags)
+user_plan_ids: Dict[str, Dict[str, None]] = defaultdict(dict)
+user_plan_versions: Dict[str, int] = defaultdict(int)
+# Guards user_plan_versions; store writes are not serialized without DATA_DIR
+_versions_lock = threading.Lock()
+# Distinguishes this process's versions from those of earlier runs
+STORE_INSTANCE = secrets.token_hex(4)
 
 # Auto-increment IDs
 user_id_counter = {"value": 1}
 meal_plan_id_counter = {"value": 1}
 
+STUB_FIELDS = ("id", "user_id", "days", "preferences", "servings", "target_calories",
+               "recipes", "created_at")
+
+# Fields that seed-mode records regenerate plan_content from
+GENERATION_FIELDS = ("days", "preferences", "servings", "target_calories", "seed", "catalog_version",
+                     "generator")
+
+# Guards ID allocation when the server runs with multiple threads
+_id_lock = threading.Lock()
+
+# Striped per-plan locks serializing read-modify-write edits of a plan
+_plan_locks = [threading.RLock() for _ in range(64)]
+
+
+def apply_op(op: str, payload: dict):
+    """
+    Apply one logged store operation. Used both for live writes and for
+    replaying the operation log; every operation is idempotent.
+
+    Stored records are never changed in place: edits store a new record,
+    so a snapshot only has to copy the top-level dicts.
+    """
+    if op == "user.create":
+        users_db[payload["id"]] = payload
+        _bump_counter(user_id_counter, payload["id"])
+    elif op == "plan.create":
+        meal_plans_db[payload["id"]] = payload
+        _bump_counter(meal_plan_id_counter, payload["id"])
+        _index_record(payload)
+        history.record_plan(payload["user_id"], payload.get("recipes", ()))
+        analytics.add_plan(payload)
+        cold_store.touch(payload["id"])
+        user_plan_ids[payload["user_id"]][payload["id"]] = None
+        _bump_version(payload["user_id"])
+    elif op == "plan.create_many":
+        for record in payload["records"]:
+            apply_op("plan.create", record)
+    elif op == "plan.update":
+        record = meal_plans_db.get(payload["id"])
+        if record is not None:
+            updates = payload["updates"]
+            analytics.remove_plan(record)
+            if "recipes" in updates:
+                _unindex_record(record)
+            # Content is held in exactly one representation; either of
+            # these also replaces content rebuilt from the seed
+            if BLOB_KEY in updates:
+                replaced = "plan_content"
+            elif "plan_content" in updates:
+                replaced = BLOB_KEY
+            else:
+                replaced = None
+            record = {k: v for k, v in record.items() if k != replaced}
+            record.update(updates)
+            meal_plans_db[payload["id"]] = record
+            if "recipes" in updates:
+                _index_record(record)
+            analytics.add_plan(record)
+            _bump_version(record["user_id"])
+            invalidate_plan(payload["id"])
+    elif op == "plan.patch_day":
+        record = meal_plans_db.get(payload["id"])
+        if record is not None:
+            _unindex_record(record)
+            analytics.remove_plan(record)
+            record = _patch_day(record, payload["day_index"], payload["day"])
+            meal_plans_db[payload["id"]] = record
+            _index_record(record)
+            analytics.add_plan(record)
+            _bump_version(record["user_id"])
+            invalidate_plan(payload["id"])
+    elif op == "plan.freeze":
+        record = meal_plans_db.pop(payload["id"], None)
+        if record is not None:
+            stub = {field: record.get(field) for field in STUB_FIELDS}
+            stub["last_access"] = payload["last_access"]
+            cold_plans[payload["id"]] = stub
+            cold_store.last_access.pop(payload["id"], None)
+            invalidate_plan(payload["id"])
+    elif op == "plan.thaw":
+        # The record comes back exactly as it was frozen, so indexes are unchanged
+        if cold_plans.pop(payload["id"], None) is not None:
+            meal_plans_db[payload["id"]] = cold_store.decode(payload["data"])
+    elif op == "plan.delete":
+        record = meal_plans_db.pop(payload["id"], None) or cold_plans.pop(payload["id"], None)
+        if record is not None:
+            cold_store.last_access.pop(payload["id"], None)
+            cold_store.remove(payload["id"])
+            _unindex_record(record)
+            analytics.remove_plan(record)
+            user_plan_ids[record["user_id"]].pop(payload["id"], None)
+            _bump_version(record["user_id"])
+            invalidate_plan(payload["id"])
+
+
+def _bump_version(user_id: str):
+    with _versions_lock:
+        user_plan_versions[user_id] += 1
+
+
+def _patch_day(record: dict, day_index: int, day: dict) -> dict:
+    """Return a copy of a stored plan with one day of its content replaced."""
+    content = materialize(record)["plan_content"]
+    days = list(content["days"])
+    days[day_index] = day
+    content = dict(content, days=days)
+    if "plan_content" in record:
+        record = dict(record, plan_content=content)
+    else:
+        # Seed-mode content cannot hold an edit, so store the edited plan as a blob
+        record = dict(record)
+        record[BLOB_KEY] = pack_content(content)
+    record["recipes"] = search.plan_recipe_names(content)
+    return record
+
+
+def _index_record(record: dict):
+    search.index_plan(record["user_id"], record["id"], record.get("recipes", ()))
+
+
+def _unindex_record(record: dict):
+    search.unindex_plan(record["user_id"], record["id"], record.get("recipes", ()))
+
+
+def _bump_counter(counter: dict, record_id: str):
+    """Keep an ID counter ahead of a recovered record ID."""
+    counter["value"] = max(counter["value"], int(record_id) + 1)
+
+
+def dump_state() -> dict:
+    """
+    Return a copy of the full store for snapshotting. Records are replaced
+    rather than changed in place, so copying the dicts is enough.
+    """
+    return {
+        "users": dict(users_db),
+        "meal_plans": dict(meal_plans_db),
+        "cold_plans": dict(cold_plans),
+        "user_id_counter": user_id_counter["value"],
+        "meal_plan_id_counter": meal_plan_id_counter["value"]
+    }
+
+
+def load_state(state: dict):
+    """Restore the store from a snapshot."""
+    users_db.clear()
+    users_db.update(state["users"])
+    meal_plans_db.clear()
+    meal_plans_db.update(state["meal_plans"])
+    cold_plans.clear()
+    cold_plans.update(state.get("cold_plans", {}))
+    user_id_counter["value"] = state["user_id_counter"]
+    meal_plan_id_counter["value"] = state["meal_plan_id_counter"]
+    search.clear_plan_index()
+    history.clear()
+    analytics.clear()
+    user_plan_ids.clear()
+    records = list(meal_plans_db.values()) + list(cold_plans.values())
+    for record in sorted(records, key=lambda plan: int(plan["id"])):
+        _index_record(record)
+        history.record_plan(record["user_id"], record.get("recipes", ()))
+        analytics.add_plan(record)
+        user_plan_ids[record["user_id"]][record["id"]] = None
+        _bump_version(record["user_id"])
+
 
 class User:
     """User model for authentication and profile management."""
@@ -21,8 +210,9 @@ class User:
     @staticmethod
     def create(username: str, email: str, password_hash: str) -> dict:
         """Create a new user."""
-        user_id = str(user_id_counter["value"])
-        user_id_counter["value"] += 1
+        with _id_lock:
+            user_id = str(user_id_counter["value"])
+            user_id_counter["value"] += 1
         
         user = {
             "id": user_id,
@@ -31,7 +221,7 @@ class User:
             "password_hash": password_hash,
             "created_at": datetime.utcnow().isoformat()
         }
-        users_db[user_id] = user
+        persistence.commit("user.create", user, lambda: apply_op("user.create", user))
         return user
     
     @staticmethod
@@ -52,46 +242,195 @@ class MealPlan:
     """Meal plan model for storing generated plans."""
     
     @staticmethod
-    def create(user_id: str, plan_data: dict) -> dict:
-        """Create a new meal plan."""
-        plan_id = str(meal_plan_id_counter["value"])
-        meal_plan_id_counter["value"] += 1
+    def _new_plan(user_id: str, plan_data: dict) -> dict:
+        """Allocate an ID and build a plan dict from plan_data."""
+        with _id_lock:
+            plan_id = str(meal_plan_id_counter["value"])
+            meal_plan_id_counter["value"] += 1
         
-        meal_plan = {
+        plan_content = plan_data.get("plan_content") or {}
+        return {
             "id": plan_id,
             "user_id": user_id,
             "days": plan_data.get("days"),
             "preferences": plan_data.get("preferences"),
             "servings": plan_data.get("servings"),
             "target_calories": plan_data.get("target_calories"),
+            "seed": plan_content.get("seed"),
+            "catalog_version": plan_content.get("catalog_version"),
+            "generator": plan_content.get("generator", 1),
+            "recipes": search.plan_recipe_names(plan_content),
             "plan_content": plan_data.get("plan_content"),
             "created_at": datetime.utcnow().isoformat()
         }
-        meal_plans_db[plan_id] = meal_plan
+    
+    @staticmethod
+    def create(user_id: str, plan_data: dict) -> dict:
+        """Create a new meal plan."""
+        meal_plan = MealPlan._new_plan(user_id, plan_data)
+        record = to_record(meal_plan, reproducible=True)
+        persistence.commit("plan.create", record, lambda: apply_op("plan.create", record))
         return meal_plan
     
+    @staticmethod
+    def create_many(user_id: str, plans_data: List[dict]) -> List[str]:
+        """
+        Create several meal plans as one logged operation, so a bulk
+        import pays for one log write and fsync per batch.
+        Returns the new plan IDs.
+        """
+        records = [to_record(MealPlan._new_plan(user_id, plan_data), reproducible=True)
+                   for plan_data in plans_data]
+        payload = {"records": records}
+        persistence.commit("plan.create_many", payload, lambda: apply_op("plan.create_many", payload))
+        return [record["id"] for record in records]
+    
     @staticmethod
     def find_by_user(user_id: str) -> List[dict]:
-        """Find all meal plans for a user."""
-        return [plan for plan in meal_plans_db.values() if plan["user_id"] == user_id]
+        """
+        Find all meal plans for a user. Cold plans stay in the cold store
+        and are returned without plan_content; find_by_id loads them.
+        Plans whose content cannot be rebuilt are listed the same way.
+        """
+        plans = []
+        for record in MealPlan.find_records_by_user(user_id):
+            if record["id"] not in cold_plans:
+                try:
+                    plans.append(materialize(record))
+                    continue
+                except PlanUnavailable:
+                    pass
+            plans.append({field: record.get(field) for field in STUB_FIELDS})
+        return plans
+    
+    @staticmethod
+    def find_records_by_user(user_id: str) -> List[dict]:
+        """
+        Stored records of a user's plans, oldest first, without decoding
+        content. Cold plans are returned as stubs without content and
+        stay in the cold store.
+        """
+        records = []
+        for plan_id in list(user_plan_ids.get(user_id, ())):
+            record = meal_plans_db.get(plan_id) or cold_plans.get(plan_id)
+            if record is not None:
+                records.append(record)
+        return records
+    
+    @staticmethod
+    def user_version(user_id: str) -> int:
+        """
+        Counter that changes whenever any of a user's plans change. It
+        restarts with the process; pair it with STORE_INSTANCE.
+        """
+        return user_plan_versions.get(user_id, 0)
+    
+    @staticmethod
+    def owner(plan_id: str) -> Optional[str]:
+        """User ID of a hot or cold plan, without loading a cold plan."""
+        record = meal_plans_db.get(plan_id) or cold_plans.get(plan_id)
+        return record["user_id"] if record is not None else None
     
     @staticmethod
     def find_by_id(plan_id: str) -> Optional[dict]:
         """Find meal plan by ID."""
-        return meal_plans_db.get(plan_id)
+        record = MealPlan.find_record(plan_id)
+        return materialize(record) if record is not None else None
+    
+    @staticmethod
+    def find_record(plan_id: str) -> Optional[dict]:
+        """
+        Find the stored record for a plan without decoding its content.
+        Compressed records carry plan_blob instead of plan_content.
+        Cold plans are moved back into memory.
+        """
+        record = meal_plans_db.get(plan_id)
+        if record is None and plan_id in cold_plans:
+            record = MealPlan._thaw(plan_id)
+        if record is not None:
+            cold_store.touch(plan_id)
+        return record
+    
+    @staticmethod
+    def _thaw(plan_id: str) -> Optional[dict]:
+        """Load a cold plan back into meal_plans_db."""
+        with cold_store.lock:
+            if plan_id in cold_plans:
+                payload = {"id": plan_id, "data": cold_store.read(plan_id)}
+                persistence.commit("plan.thaw", payload, lambda: apply_op("plan.thaw", payload))
+                cold_store.remove(plan_id)
+            return meal_plans_db.get(plan_id)
+    
+    @staticmethod
+    def freeze(plan_id: str, idle_since: Optional[float] = None) -> bool:
+        """
+        Move a plan to the cold store, keeping only its stub in memory.
+        With idle_since, plans accessed after that time stay hot.
+        """
+        # The plan lock keeps edits from landing between writing the cold
+        # copy and dropping the hot record
+        with MealPlan.lock(plan_id), cold_store.lock:
+            record = meal_plans_db.get(plan_id)
+            if record is None:
+                return False
+            if idle_since is not None and cold_store.last_access.get(plan_id, idle_since) > idle_since:
+                return False
+            cold_store.write(plan_id, cold_store.encode(record))
+            payload = {"id": plan_id, "last_access": cold_store.last_access.get(plan_id, time.time())}
+            persistence.commit("plan.freeze", payload, lambda: apply_op("plan.freeze", payload))
+            return True
     
     @staticmethod
     def delete(plan_id: str) -> bool:
         """Delete a meal plan."""
-        if plan_id in meal_plans_db:
-            del meal_plans_db[plan_id]
+        with MealPlan.lock(plan_id):
+            if plan_id in meal_plans_db or plan_id in cold_plans:
+                payload = {"id": plan_id}
+                persistence.commit("plan.delete", payload, lambda: apply_op("plan.delete", payload))
+                return True
+            return False
+    
+    @staticmethod
+    def lock(plan_id: str) -> threading.RLock:
+        """
+        Lock to hold while reading a plan and writing a change based on
+        what was read. update() and replace_day() take it too.
+        """
+        return _plan_locks[hash(plan_id) % len(_plan_locks)]
+    
+    @staticmethod
+    def replace_day(plan_id: str, day_index: int, day: dict) -> bool:
+        """
+        Replace a single day of a plan's content. Only the day is logged,
+        so the cost does not grow with plan length.
+        """
+        with MealPlan.lock(plan_id):
+            if MealPlan.find_record(plan_id) is None:
+                return False
+            payload = {"id": plan_id, "day_index": day_index, "day": day}
+            persistence.commit("plan.patch_day", payload, lambda: apply_op("plan.patch_day", payload))
             return True
-        return False
     
     @staticmethod
     def update(plan_id: str, updates: dict) -> Optional[dict]:
         """Update a meal plan."""
-        if plan_id in meal_plans_db:
-            meal_plans_db[plan_id].update(updates)
-            return meal_plans_db[plan_id]
+        with MealPlan.lock(plan_id):
+            return MealPlan._update(plan_id, updates)
+    
+    @staticmethod
+    def _update(plan_id: str, updates: dict) -> Optional[dict]:
+        record = MealPlan.find_record(plan_id)
+        if record is not None:
+            # Editing generation fields of a seed-mode plan must not change
+            # its content, so pin the current content first
+            if ("plan_content" not in updates and "plan_content" not in record
+                    and BLOB_KEY not in record
+                    and any(field in updates for field in GENERATION_FIELDS)):
+                updates = {**updates, "plan_content": rebuild_content(record)}
+            if "plan_content" in updates:
+                updates = {**updates, "recipes": search.plan_recipe_names(updates["plan_content"])}
+            updates = to_record(updates)
+            payload = {"id": plan_id, "updates": updates}
+            persistence.commit("plan.update", payload, lambda: apply_op("plan.update", payload))
+            return MealPlan.find_by_id(plan_id)
         return None
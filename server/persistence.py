@@ -0,0 +1,338 @@
+"""
+Write-ahead operation log and snapshots for the in-memory store.
+
+Every write to users_db/meal_plans_db is appended to an operation log
+before the caller returns. Appends are buffered and flushed by a single
+background thread that fsyncs once per batch (group commit), so
+concurrent writers share the cost of each fsync. After enough operations
+the log is rotated and a copy of the store taken at the rotation point
+is pickled to a snapshot, tagged with the sequence number of the last
+record it includes; writers only wait for the copy, not for the pickling.
+Once the snapshot is durable the rotated log is deleted. On startup the
+snapshot is loaded and the log records after it are replayed on top.
+
+Persistence is enabled by setting DATA_DIR; without it the store stays
+memory-only and commit() just applies the change.
+"""
+
+import atexit
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+DATA_DIR = os.getenv('DATA_DIR')
+FSYNC_INTERVAL_MS = float(os.getenv('WAL_FSYNC_INTERVAL_MS', 2))
+SNAPSHOT_EVERY = int(os.getenv('WAL_SNAPSHOT_EVERY', 200000))
+
+LOG_FILE = 'oplog.bin'
+# The log before the last rotation, kept until a snapshot covers it
+PREVIOUS_LOG_FILE = 'oplog.prev.bin'
+SNAPSHOT_FILE = 'snapshot.pickle'
+
+# Frame header: payload length and CRC32 of the payload
+_HEADER = struct.Struct('<II')
+
+# First record of every log: the log sequence number (LSN) of the last
+# record before it. Records after it are numbered from there, so replay
+# can skip records a snapshot already contains.
+LOG_START = 'log.start'
+
+
+def encode_record(op: str, payload) -> bytes:
+    """Encode one log record as a length-prefixed, checksummed frame."""
+    data = pickle.dumps((op, payload), protocol=pickle.HIGHEST_PROTOCOL)
+    return _HEADER.pack(len(data), zlib.crc32(data)) + data
+
+
+def read_records(path: Path):
+    """
+    Yield (op, payload, end_offset) from a log file, reading one frame at
+    a time. Stops at the first torn or corrupt frame, which is where a
+    crash interrupted the last write.
+    """
+    if not path.exists():
+        return
+    offset = 0
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            length, crc = _HEADER.unpack(header)
+            frame = f.read(length)
+            if len(frame) < length or zlib.crc32(frame) != crc:
+                return
+            op, payload = pickle.loads(frame)
+            offset += _HEADER.size + length
+            yield op, payload, offset
+
+
+class OperationLog:
+    """Append-only operation log with group commit and snapshotting."""
+
+    def __init__(self, directory: str, dump_state: Callable[[], dict],
+                 fsync_interval: float = FSYNC_INTERVAL_MS / 1000,
+                 snapshot_every: int = SNAPSHOT_EVERY, start_lsn: int = 0):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.log_path = self.directory / LOG_FILE
+        self.previous_log_path = self.directory / PREVIOUS_LOG_FILE
+        self.snapshot_path = self.directory / SNAPSHOT_FILE
+        # Must return a copy that later writes do not change, since it is
+        # pickled after the lock is released
+        self.dump_state = dump_state
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+
+        # One lock serializes store mutations, log appends and snapshot copies
+        self.lock = threading.Lock()
+        # Held while writing to the log file; always taken before self.lock
+        self._io_lock = threading.Lock()
+        # Background thread writing a snapshot, if one is running
+        self._snapshotter: Optional[threading.Thread] = None
+        # One snapshot is written at a time
+        self._snapshot_lock = threading.Lock()
+        self._cond = threading.Condition(self.lock)
+        self._buffer = []
+        self._appended_seq = 0
+        self._durable_seq = 0
+        self._ops_since_snapshot = 0
+        self._closed = False
+        # LSN of the record before the first one appended by this process
+        self._start_lsn = start_lsn
+        # Set when the flusher fails; later commits raise it
+        self._error: Optional[BaseException] = None
+
+        self._file = open(self.log_path, 'ab')
+        if self._file.tell() == 0:
+            self._write_start(start_lsn)
+        self._start_flusher()
+
+        # gunicorn forks workers after preloading the app; threads do not survive fork
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _start_flusher(self):
+        self._flusher = threading.Thread(target=self._flush_loop, name='oplog-flusher', daemon=True)
+        self._flusher.start()
+
+    def _reset_after_fork(self):
+        self.lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._cond = threading.Condition(self.lock)
+        self._snapshotter = None
+        self._snapshot_lock = threading.Lock()
+        if not self._closed:
+            self._start_flusher()
+
+    def _write_start(self, lsn: int):
+        """Begin an empty log file with its LOG_START record."""
+        self._file.write(encode_record(LOG_START, {'lsn': lsn}))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def commit(self, op: str, payload, apply: Callable[[], None]):
+        """
+        Apply a store mutation and log it, then wait until the record is
+        durable. The wait happens outside the lock so that writes arriving
+        during an fsync join the next batch.
+
+        Raises the flusher's error if the log can no longer be written;
+        the change it was waiting on is then in memory but not durable.
+        """
+        frame = encode_record(op, payload)
+        with self._cond:
+            if self._error is not None:
+                raise self._error
+            apply()
+            self._buffer.append(frame)
+            self._appended_seq += 1
+            seq = self._appended_seq
+            self._cond.notify_all()
+            while self._durable_seq < seq and not self._closed and self._error is None:
+                self._cond.wait()
+            if self._durable_seq < seq and self._error is not None:
+                raise self._error
+
+    def _write_buffer(self):
+        """Write and fsync buffered frames. Caller must hold the lock."""
+        batch, self._buffer = self._buffer, []
+        self._file.write(b''.join(batch))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._ops_since_snapshot += len(batch)
+        self._durable_seq = self._appended_seq
+        self._cond.notify_all()
+
+    def _flush_loop(self):
+        try:
+            self._flush_batches()
+        except BaseException as e:
+            # Wake every waiting writer instead of leaving them blocked forever
+            with self._cond:
+                self._error = e
+                self._cond.notify_all()
+            print(f"Operation log flush failed: {e}")
+
+    def _flush_batches(self):
+        while True:
+            with self._cond:
+                while not self._buffer and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            # Let concurrent writers pile into this batch
+            if self.fsync_interval:
+                time.sleep(self.fsync_interval)
+            with self._io_lock:
+                with self._cond:
+                    batch, self._buffer = self._buffer, []
+                    seq = self._appended_seq
+                self._file.write(b''.join(batch))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            with self._cond:
+                self._ops_since_snapshot += len(batch)
+                self._durable_seq = max(self._durable_seq, seq)
+                self._cond.notify_all()
+                due = self._ops_since_snapshot >= self.snapshot_every and self._snapshotter is None
+                if due:
+                    self._snapshotter = threading.Thread(
+                        target=self._snapshot_in_background, name='oplog-snapshot', daemon=True
+                    )
+            if due:
+                self._snapshotter.start()
+
+    def _snapshot_in_background(self):
+        try:
+            self.snapshot()
+        except Exception as e:
+            # The logs still hold every record, so recovery is unaffected
+            print(f"Snapshot failed: {e}")
+        finally:
+            with self._cond:
+                self._snapshotter = None
+
+    def snapshot(self):
+        """
+        Write a compact snapshot of the whole store and drop the log
+        records it holds. Only copying the state and rotating the log hold
+        the lock; writers keep committing while the copy is pickled.
+        """
+        with self._snapshot_lock:
+            lsn, state = self._rotate()
+            tmp_path = self.snapshot_path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'lsn': lsn, 'state': state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            # A crash before this leaves records the snapshot already holds;
+            # recover() skips them by LSN
+            self.previous_log_path.unlink(missing_ok=True)
+
+    def _rotate(self) -> Tuple[int, dict]:
+        """Copy the store and start a new log file at the same point."""
+        with self._io_lock, self._cond:
+            if self._buffer:
+                self._write_buffer()
+            # Every appended record has been applied and written, so the
+            # copy includes everything up to this LSN
+            lsn = self._start_lsn + self._appended_seq
+            state = self.dump_state()
+            # If an earlier snapshot never completed, the previous log still
+            # holds records no snapshot has; keep appending to the current
+            # log instead of replacing it
+            if not self.previous_log_path.exists():
+                os.replace(self.log_path, self.previous_log_path)
+                self._file.close()
+                self._file = open(self.log_path, 'wb')
+                self._write_start(lsn)
+            self._ops_since_snapshot = 0
+        return lsn, state
+
+    def close(self):
+        """Flush outstanding records and stop the flusher thread."""
+        with self._io_lock, self._cond:
+            if self._closed:
+                return
+            if self._buffer:
+                self._write_buffer()
+            self._closed = True
+            self._cond.notify_all()
+        self._flusher.join()
+        snapshotter = self._snapshotter
+        if snapshotter is not None:
+            snapshotter.join()
+        self._file.close()
+
+
+def recover(directory: str, load_state: Callable[[dict], None],
+            apply_op: Callable[[str, object], None]) -> int:
+    """
+    Load the latest snapshot and replay the log on top of it.
+    Returns the number of replayed log records.
+    """
+    replayed, _ = _recover(directory, load_state, apply_op)
+    return replayed
+
+
+def _recover(directory: str, load_state, apply_op) -> Tuple[int, int]:
+    """recover() that also returns the LSN of the last applied record."""
+    directory = Path(directory)
+    snapshot_path = directory / SNAPSHOT_FILE
+    snapshot_lsn = 0
+    if snapshot_path.exists():
+        with open(snapshot_path, 'rb') as f:
+            snapshot = pickle.load(f)
+        # Snapshots written before LSNs are the bare state
+        if set(snapshot) == {'lsn', 'state'}:
+            snapshot_lsn, snapshot = snapshot['lsn'], snapshot['state']
+        load_state(snapshot)
+
+    log_path = directory / LOG_FILE
+    replayed = 0
+    lsn = snapshot_lsn
+    numbered = False
+    # A rotated log is left behind when a snapshot did not complete
+    for path in (directory / PREVIOUS_LOG_FILE, log_path):
+        valid_length = 0
+        for op, payload, valid_length in read_records(path):
+            if op == LOG_START:
+                lsn, numbered = payload['lsn'], True
+                continue
+            lsn += 1
+            if numbered and lsn <= snapshot_lsn:
+                continue
+            apply_op(op, payload)
+            replayed += 1
+
+    # Drop a torn tail so new records are not appended after garbage
+    if log_path.exists() and log_path.stat().st_size > valid_length:
+        os.truncate(log_path, valid_length)
+    return replayed, max(lsn, snapshot_lsn)
+
+
+# Active log, set by open_log()
+oplog: Optional[OperationLog] = None
+
+
+def open_log(directory: str, dump_state, load_state, apply_op) -> int:
+    """Recover the store from disk and start logging new writes."""
+    global oplog
+    replayed, lsn = _recover(directory, load_state, apply_op)
+    oplog = OperationLog(directory, dump_state, start_lsn=lsn)
+    atexit.register(oplog.close)
+    return replayed
+
+
+def commit(op: str, payload, apply: Callable[[], None]):
+    """Apply a store mutation, logging it first when persistence is enabled."""
+    if oplog is None:
+        apply()
+    else:
+        oplog.commit(op, payload, apply)
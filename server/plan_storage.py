@@ -0,0 +1,248 @@
+"""
+Compact at-rest representation for stored plan_content.
+
+In "compressed" mode each plan's content is kept as a JSON blob
+compressed against a shared dictionary of recipe text, frozen in
+DICTIONARY_DIR so blobs stay readable when the recipes change.
+Recipe names, ingredient lists and instructions repeat across every
+plan, so the dictionary lets even a one-day plan compress well. Blobs
+are decoded only when the plan is read.
+
+In "seed" mode generated plans keep only their generation parameters,
+seed and catalog version, and plan_content is rebuilt on read behind a
+small LRU cache, from the same catalog version. Only plans from a
+catalog version that is kept durably (the built-in catalogs, or catalog
+files copied under DATA_DIR) are stored this way; other plans, and plans
+whose content was edited, fall back to blobs.
+
+Uses zstandard when installed and zlib otherwise.
+"""
+
+import argparse
+import os
+import struct
+import threading
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict
+
+from serialization import dumps_bytes, loads
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+# "full" keeps plan_content as Python objects, "compressed" keeps blobs,
+# "seed" keeps only what is needed to regenerate the plan
+PLAN_STORAGE = os.getenv('PLAN_STORAGE', 'full')
+REBUILD_CACHE_SIZE = int(os.getenv('PLAN_REBUILD_CACHE_SIZE', 1024))
+
+# Stored records keep the blob under this key instead of plan_content
+BLOB_KEY = "plan_blob"
+
+# Blob header: codec byte and CRC32 of the dictionary it was packed with
+_HEADER = struct.Struct('<cI')
+
+# Compression dictionaries, one file per dictionary ID (its CRC32). Blobs
+# live on in the operation log, snapshots and cold files, so a dictionary
+# file must never change or be removed; to use a new dictionary, add its
+# file with `python -m plan_storage build-dictionary` and point
+# DICTIONARY_ID at it.
+DICTIONARY_DIR = Path(__file__).resolve().parent / "dictionaries"
+DICTIONARY_ID = 0x1b583d8d
+CODEC_ZLIB = b'z'
+CODEC_ZSTD = b's'
+
+
+class PlanUnavailable(Exception):
+    """A seed-mode plan's content cannot be rebuilt because its recipe catalog is gone."""
+
+
+class _Codec:
+    """Compressor for plan JSON primed with one frozen dictionary."""
+
+    def __init__(self, dictionary: bytes):
+        self.dictionary = dictionary
+        self.dict_id = zlib.crc32(dictionary)
+        if zstandard is not None:
+            zdict = zstandard.ZstdCompressionDict(
+                self.dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT
+            )
+            self.codec = CODEC_ZSTD
+            self._compressor = zstandard.ZstdCompressor(level=9, dict_data=zdict)
+            self._decompressor = zstandard.ZstdDecompressor(dict_data=zdict)
+        else:
+            self.codec = CODEC_ZLIB
+
+    def compress(self, data: bytes) -> bytes:
+        header = _HEADER.pack(self.codec, self.dict_id)
+        if self.codec == CODEC_ZSTD:
+            return header + self._compressor.compress(data)
+        compressor = zlib.compressobj(9, zdict=self.dictionary)
+        return header + compressor.compress(data) + compressor.flush()
+
+    def decompress(self, codec: bytes, payload: bytes) -> bytes:
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise ValueError("Plan blob requires the zstandard package")
+            return self._decompressor.decompress(payload)
+        decompressor = zlib.decompressobj(zdict=self.dictionary)
+        return decompressor.decompress(payload) + decompressor.flush()
+
+
+def build_dictionary() -> bytes:
+    """
+    Build a dictionary from the built-in recipe catalog, encoded the way
+    meals appear inside plan_content. zlib only looks at the last 32KB,
+    so the most common text is placed at the end. Only used to create a
+    new frozen dictionary; see main().
+    """
+    from services.openai_service import BUILTIN_MEAL_DATABASE
+
+    chunks = []
+    for recipes in BUILTIN_MEAL_DATABASE.values():
+        for recipe in recipes:
+            chunks.append(dumps_bytes({
+                "name": recipe["name"],
+                "ingredients": recipe["ingredients"],
+                "protein": recipe["protein"],
+                "carbs": recipe["carbs"],
+                "fat": recipe["fat"],
+                "instructions": recipe["instructions"]
+            }))
+    chunks.append(b'{"day":1,"date":"Day 1","meals":[{"type":"Breakfast","name":'
+                  b'{"type":"Lunch","name":{"type":"Dinner","name":{"type":"Snack","name":'
+                  b'"ingredients":["calories":"protein":"carbs":"fat":"instructions":'
+                  b'"total_calories":},{"title":"days":[{"summary":{"total_days":'
+                  b'"avg_daily_calories":"dietary_notes":"Balanced nutrition plan"'
+                  b'"seed":"catalog_version":')
+    return b"".join(chunks)[-32768:]
+
+
+def _dictionary_path(dict_id: int) -> Path:
+    return DICTIONARY_DIR / f"{dict_id:08x}.bin"
+
+
+_codecs: Dict[int, _Codec] = {}
+_codecs_lock = threading.Lock()
+
+
+def _get_codec(dict_id: int = DICTIONARY_ID) -> _Codec:
+    """Codec for a frozen dictionary, loaded from DICTIONARY_DIR on first use."""
+    codec = _codecs.get(dict_id)
+    if codec is None:
+        with _codecs_lock:
+            codec = _codecs.get(dict_id)
+            if codec is None:
+                try:
+                    dictionary = _dictionary_path(dict_id).read_bytes()
+                except FileNotFoundError:
+                    raise ValueError(f"Plan blob was packed with unknown dictionary {dict_id:08x}") from None
+                if zlib.crc32(dictionary) != dict_id:
+                    raise ValueError(f"Dictionary file for {dict_id:08x} is corrupt")
+                codec = _codecs[dict_id] = _Codec(dictionary)
+    return codec
+
+
+def pack_content(plan_content) -> bytes:
+    """Serialize and compress plan_content into a blob."""
+    return _get_codec().compress(dumps_bytes(plan_content))
+
+
+def unpack_encoded(blob: bytes) -> bytes:
+    """Return the JSON bytes of a blob without building Python objects."""
+    codec, dict_id = _HEADER.unpack_from(blob)
+    return _get_codec(dict_id).decompress(codec, blob[_HEADER.size:])
+
+
+def unpack_content(blob: bytes):
+    """Decode a blob back into plan_content."""
+    return loads(unpack_encoded(blob))
+
+
+@lru_cache(maxsize=REBUILD_CACHE_SIZE)
+def _rebuild(days, preferences, servings, target_calories, seed, version, generator):
+    from services.openai_service import catalog_for_version, generate_meal_plan
+
+    catalog = catalog_for_version(version)
+    if catalog is None:
+        raise PlanUnavailable(f"Meal plan content cannot be rebuilt: recipe catalog {version} "
+                              f"is no longer available")
+    return generate_meal_plan(days, preferences, servings, target_calories, seed=seed,
+                              generator=generator, catalog=catalog)
+
+
+def rebuild_content(record: dict):
+    """
+    Regenerate plan_content for a record stored in seed mode. Raises
+    PlanUnavailable if the plan's catalog version is gone.
+    """
+    # Records from before generator versions were stored are version 1
+    return _rebuild(record["days"], record["preferences"], record["servings"],
+                    record["target_calories"], record["seed"], record["catalog_version"],
+                    record.get("generator", 1))
+
+
+def to_record(meal_plan: dict, reproducible: bool = False) -> dict:
+    """
+    Convert a plan into its stored form for the configured mode.
+    Pass reproducible=True only when plan_content is exactly what
+    generate_meal_plan returned for the plan's own parameters and seed.
+    """
+    if PLAN_STORAGE == "full" or "plan_content" not in meal_plan:
+        return meal_plan
+    record = {k: v for k, v in meal_plan.items() if k != "plan_content"}
+    content = meal_plan["plan_content"]
+    if (PLAN_STORAGE == "seed" and reproducible and meal_plan.get("seed") is not None
+            and not (isinstance(content, dict) and content.get("variety"))):
+        from services.openai_service import catalog_is_durable
+
+        # Only versions that survive a catalog change or a restart; plans
+        # from any other catalog keep their content as a blob
+        if catalog_is_durable(meal_plan.get("catalog_version")):
+            return record
+    record[BLOB_KEY] = pack_content(meal_plan["plan_content"])
+    return record
+
+
+def materialize(record: dict) -> dict:
+    """Return a stored record as a plain plan dict with plan_content."""
+    if "plan_content" in record:
+        return record
+    plan = {k: v for k, v in record.items() if k != BLOB_KEY}
+    if BLOB_KEY in record:
+        plan["plan_content"] = unpack_content(record[BLOB_KEY])
+    else:
+        plan["plan_content"] = rebuild_content(record)
+    return plan
+
+
+def encoded_content(record: dict) -> bytes:
+    """JSON bytes of a stored record's plan_content."""
+    if "plan_content" in record:
+        return dumps_bytes(record["plan_content"])
+    if BLOB_KEY in record:
+        return unpack_encoded(record[BLOB_KEY])
+    return dumps_bytes(rebuild_content(record))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan storage tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("build-dictionary",
+                          help="freeze a new compression dictionary from the built-in recipes")
+    parser.parse_args()
+
+    dictionary = build_dictionary()
+    dict_id = zlib.crc32(dictionary)
+    path = _dictionary_path(dict_id)
+    if not path.exists():
+        path.write_bytes(dictionary)
+    print(f"Wrote {len(dictionary):,} byte dictionary to {path}; "
+          f"set DICTIONARY_ID = 0x{dict_id:08x} to pack new blobs with it")
+
+
+if __name__ == "__main__":
+    main()
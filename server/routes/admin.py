@@ -0,0 +1,56 @@
+"""
+Admin routes for system-wide analytics.
+Access is limited to users whose email is listed in ADMIN_EMAILS.
+"""
+
+from flask import Blueprint, request, jsonify
+from routes.auth import token_required
+from db import get_db_stats
+from services import analytics
+from functools import wraps
+import os
+
+admin_bp = Blueprint('admin', __name__)
+
+# Comma-separated emails of users allowed to use admin routes
+ADMIN_EMAILS = {
+    email.strip().lower()
+    for email in os.getenv('ADMIN_EMAILS', '').split(',')
+    if email.strip()
+}
+
+
+def admin_required(f):
+    """Decorator for routes that only admins may call."""
+    @wraps(f)
+    @token_required
+    def decorated(current_user, *args, **kwargs):
+        if current_user['email'].lower() not in ADMIN_EMAILS:
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(current_user, *args, **kwargs)
+    
+    return decorated
+
+
+@admin_bp.route('/analytics', methods=['GET'])
+@admin_required
+def get_analytics(current_user):
+    """
+    Get the recipes used by the most plans, calorie and plan length
+    distributions and plans created per day across all users.
+    
+    Query parameters:
+        top: number of recipes to list (default 20, max 1000)
+    """
+    try:
+        top = request.args.get('top', 20, type=int)
+        if top < 1 or top > 1000:
+            return jsonify({'error': 'top must be between 1 and 1000'}), 400
+        
+        return jsonify({
+            'system_stats': get_db_stats(),
+            **analytics.rollups(top_recipes=top)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to fetch analytics: {str(e)}'}), 500
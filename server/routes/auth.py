@@ -9,6 +9,7 @@ import jwt
 import os
 from datetime import datetime, timedelta
 from functools import wraps
+from typing import Optional, Tuple
 from models import User
 
 auth_bp = Blueprint('auth', __name__)
@@ -37,36 +38,44 @@ def create_token(user_id: str) -> str:
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 
+def authenticate(auth_header: Optional[str]) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Resolve the user for an Authorization header.
+    Returns (user, None) on success or (None, error message) on failure.
+    """
+    token = None
+    if auth_header and auth_header.startswith('Bearer '):
+        token = auth_header.split(' ')[1]
+    
+    if not token:
+        return None, 'Authentication token is missing'
+    
+    try:
+        # Decode and verify token
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        return None, 'Token has expired'
+    except jwt.InvalidTokenError:
+        return None, 'Invalid token'
+    
+    current_user = User.find_by_id(payload['user_id'])
+    if not current_user:
+        return None, 'User not found'
+    
+    return current_user, None
+
+
 def token_required(f):
     """Decorator to protect routes with JWT authentication."""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        
-        # Check for token in Authorization header
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            if auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
-        
-        if not token:
-            return jsonify({'error': 'Authentication token is missing'}), 401
-        
-        try:
-            # Decode and verify token
-            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-            current_user = User.find_by_id(payload['user_id'])
-            
-            if not current_user:
-                return jsonify({'error': 'User not found'}), 401
-            
-            # Pass user to the route
-            return f(current_user, *args, **kwargs)
-            
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
+        current_user, error = authenticate(request.headers.get('Authorization'))
+        
+        if error:
+            return jsonify({'error': error}), 401
+        
+        # Pass user to the route
+        return f(current_user, *args, **kwargs)
     
     return decorated
 
@@ -2,13 +2,126 @@
 Dashboard routes for user statistics and summaries.
 """
 
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request, current_app
 from routes.auth import token_required
-from models import MealPlan
+from models import MealPlan, STORE_INSTANCE
 from db import get_db_stats
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
+# Plan fields the dashboard list shows; plan_content is left out
+PLAN_LIST_FIELDS = ('id', 'days', 'preferences', 'servings', 'target_calories', 'created_at')
+RECENT_PLANS = 5
+
+
+def build_summary(current_user: dict) -> dict:
+    """Build the dashboard summary payload for a user."""
+    # Get user's meal plans
+    user_plans = MealPlan.find_by_user(current_user['id'])
+    
+    # Calculate statistics
+    total_plans = len(user_plans)
+    total_days_planned = sum(plan.get('days', 0) for plan in user_plans)
+    
+    # Get recent plans (last 5)
+    recent_plans = sorted(
+        user_plans,
+        key=lambda x: x.get('created_at', ''),
+        reverse=True
+    )[:5]
+    
+    # Calculate average calories if available
+    avg_calories = 0
+    if user_plans:
+        calories_sum = sum(plan.get('target_calories', 0) for plan in user_plans)
+        avg_calories = calories_sum // total_plans if total_plans > 0 else 0
+    
+    # Get database stats
+    db_stats = get_db_stats()
+    
+    return {
+        'user': {
+            'id': current_user['id'],
+            'username': current_user['username'],
+            'email': current_user['email']
+        },
+        'statistics': {
+            'total_meal_plans': total_plans,
+            'total_days_planned': total_days_planned,
+            'average_target_calories': avg_calories
+        },
+        'recent_plans': recent_plans,
+        'system_stats': db_stats
+    }
+
+
+def build_bootstrap(current_user: dict) -> dict:
+    """
+    Build everything the dashboard needs on load in one pass over the
+    user's stored plans, without decoding any plan content.
+    """
+    plans = []
+    total_days_planned = 0
+    calories_sum = 0
+    for record in MealPlan.find_records_by_user(current_user['id']):
+        plans.append({field: record.get(field) for field in PLAN_LIST_FIELDS})
+        total_days_planned += record.get('days') or 0
+        calories_sum += record.get('target_calories') or 0
+    
+    # Plans are indexed oldest first
+    recent_plans = plans[-RECENT_PLANS:][::-1]
+    
+    return {
+        'user': {
+            'id': current_user['id'],
+            'username': current_user['username'],
+            'email': current_user['email']
+        },
+        'statistics': {
+            'total_meal_plans': len(plans),
+            'total_days_planned': total_days_planned,
+            'average_target_calories': calories_sum // len(plans) if plans else 0
+        },
+        'meal_plans': plans,
+        'recent_plans': recent_plans,
+        'system_stats': get_db_stats()
+    }
+
+
+def bootstrap_etag(current_user: dict) -> str:
+    """
+    ETag covering the user's plans and the system counts. The store
+    instance keeps tags from an earlier process from matching.
+    """
+    stats = get_db_stats()
+    return (f"{STORE_INSTANCE}-{current_user['id']}-{MealPlan.user_version(current_user['id'])}-"
+            f"{stats['total_users']}-{stats['total_meal_plans']}-{stats['cold_meal_plans']}")
+
+
+@dashboard_bp.route('/bootstrap', methods=['GET'])
+@token_required
+def get_bootstrap(current_user):
+    """
+    Get the user, statistics and plan list for the dashboard in one request.
+    
+    Plans are listed without plan_content. Responses carry a weak ETag, so
+    a request with a matching If-None-Match gets an empty 304.
+    """
+    try:
+        etag = bootstrap_etag(current_user)
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = jsonify(build_bootstrap(current_user))
+        response.set_etag(etag, weak=True)
+        # Let browsers keep the body but revalidate it on every load
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.headers['Vary'] = 'Authorization'
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to fetch dashboard: {str(e)}'}), 500
+
 
 @dashboard_bp.route('/summary', methods=['GET'])
 @token_required
@@ -22,43 +135,7 @@ def get_summary(current_user):
         - Overall statistics
     """
     try:
-        # Get user's meal plans
-        user_plans = MealPlan.find_by_user(current_user['id'])
-        
-        # Calculate statistics
-        total_plans = len(user_plans)
-        total_days_planned = sum(plan.get('days', 0) for plan in user_plans)
-        
-        # Get recent plans (last 5)
-        recent_plans = sorted(
-            user_plans,
-            key=lambda x: x.get('created_at', ''),
-            reverse=True
-        )[:5]
-        
-        # Calculate average calories if available
-        avg_calories = 0
-        if user_plans:
-            calories_sum = sum(plan.get('target_calories', 0) for plan in user_plans)
-            avg_calories = calories_sum // total_plans if total_plans > 0 else 0
-        
-        # Get database stats
-        db_stats = get_db_stats()
-        
-        return jsonify({
-            'user': {
-                'id': current_user['id'],
-                'username': current_user['username'],
-                'email': current_user['email']
-            },
-            'statistics': {
-                'total_meal_plans': total_plans,
-                'total_days_planned': total_days_planned,
-                'average_target_calories': avg_calories
-            },
-            'recent_plans': recent_plans,
-            'system_stats': db_stats
-        }), 200
+        return jsonify(build_summary(current_user)), 200
         
     except Exception as e:
         return jsonify({'error': f'Failed to fetch dashboard summary: {str(e)}'}), 500
@@ -1,13 +1,24 @@
 """
 Meal plan routes for CRUD operations and AI generation.
-Implements rate limiting on generate endpoint.
+Implements rate limiting and idempotency keys on generate endpoint.
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from routes.auth import token_required
 from models import MealPlan
-from services.openai_service import generate_meal_plan
+from plan_storage import materialize
+from serialization import encode_plan_response
+import idempotency
+from services import history, search
+from services.catalog import parse_grams
+from services.openai_service import (
+    generate_meal_plan, build_day, build_meal, find_recipe, pick_recipe,
+    replace_meal, MEAL_SLOTS
+)
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import random
 import time
+from typing import Optional, Tuple
 
 mealplans_bp = Blueprint('mealplans', __name__)
 
@@ -29,6 +40,268 @@ def check_rate_limit(user_id: str) -> bool:
     return True
 
 
+def validate_generate_request(data) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Validate a generation request body.
+    Returns (params, None) on success or (None, error message) on failure.
+    """
+    if not data:
+        return None, 'Request body is required'
+    
+    days = data.get('days', 7)
+    preferences = data.get('preferences', 'No specific preferences')
+    servings = data.get('servings', 2)
+    target_calories = data.get('target_calories', 2000)
+    variety = data.get('variety', False)
+    
+    # Validation
+    if not isinstance(days, int) or days < 1 or days > 30:
+        return None, 'Days must be between 1 and 30'
+    
+    if not isinstance(servings, int) or servings < 1 or servings > 10:
+        return None, 'Servings must be between 1 and 10'
+    
+    if not isinstance(target_calories, int) or target_calories < 500 or target_calories > 5000:
+        return None, 'Target calories must be between 500 and 5000'
+    
+    if not isinstance(variety, bool):
+        return None, 'Variety must be true or false'
+    
+    return {
+        'days': days,
+        'preferences': preferences,
+        'servings': servings,
+        'target_calories': target_calories,
+        'variety': variety
+    }, None
+
+
+# Fields clients may change through PUT /<plan_id>
+UPDATABLE_FIELDS = ('days', 'preferences', 'servings', 'target_calories', 'plan_content')
+# Of those, the ones checked against the generation limits
+GENERATION_PARAMS = ('days', 'preferences', 'servings', 'target_calories')
+MACRO_FIELDS = ('protein', 'carbs', 'fat')
+
+
+def _is_grams(value) -> bool:
+    """Whether a macro amount is a non-negative number or a string like "12g"."""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return False
+    try:
+        return parse_grams(value) >= 0
+    except ValueError:
+        return False
+
+
+def validate_day(day) -> Optional[str]:
+    """Check one day of plan_content against the plan schema."""
+    if not isinstance(day, dict) or not isinstance(day.get('meals'), list):
+        return 'Each day must be an object with a meals list'
+    
+    for meal in day['meals']:
+        if not isinstance(meal, dict):
+            return 'Each meal must be an object'
+        if meal.get('type') not in MEAL_SLOTS:
+            return f"Meal type must be one of: {', '.join(MEAL_SLOTS)}"
+        if not isinstance(meal.get('name'), str) or not meal['name']:
+            return 'Each meal needs a name'
+        if not isinstance(meal.get('calories'), int) or meal['calories'] < 0:
+            return 'Meal calories must be a non-negative integer'
+        if not isinstance(meal.get('ingredients', []), list):
+            return 'Meal ingredients must be a list'
+        for macro in MACRO_FIELDS:
+            if not _is_grams(meal.get(macro)):
+                return f'Meal {macro} must be a non-negative amount in grams'
+    
+    for key in ('total_calories',) + tuple(f'total_{macro}' for macro in MACRO_FIELDS):
+        if key in day and (isinstance(day[key], bool) or not isinstance(day[key], (int, float))
+                           or day[key] < 0):
+            return f'Day {key} must be a non-negative number'
+    
+    return None
+
+
+def validate_plan_update(plan: dict, data) -> Optional[str]:
+    """Validate a PUT body against the plan schema and generation limits."""
+    if not isinstance(data, dict) or not data:
+        return 'Request body is required'
+    
+    unknown = [key for key in data if key not in UPDATABLE_FIELDS]
+    if unknown:
+        return f"Cannot update fields: {', '.join(sorted(unknown))}"
+    
+    current = {field: plan.get(field) for field in GENERATION_PARAMS}
+    _, error = validate_generate_request({**current, **data})
+    if error:
+        return error
+    
+    if 'plan_content' in data:
+        content = data['plan_content']
+        if not isinstance(content, dict) or not isinstance(content.get('days'), list):
+            return 'plan_content must be an object with a days list'
+        for day in content['days']:
+            error = validate_day(day)
+            if error:
+                return error
+    
+    return None
+
+
+def check_owner(plan_id: str, user_id: str) -> Tuple[Optional[str], int]:
+    """
+    Check that a plan exists and belongs to the user, without loading it.
+    Returns (None, 200) or (error message, status).
+    """
+    owner = MealPlan.owner(plan_id)
+    if owner is None:
+        return 'Meal plan not found', 404
+    if owner != user_id:
+        return 'Unauthorized access', 403
+    return None, 200
+
+
+def find_owned_record(plan_id: str, user_id: str) -> Tuple[Optional[dict], Optional[str], int]:
+    """
+    Load a plan's stored record for its owner. Ownership is checked first,
+    so other users cannot pull cold plans back into memory.
+    Returns (record, None, 200) or (None, error message, status).
+    """
+    error, status = check_owner(plan_id, user_id)
+    if error:
+        return None, error, status
+    record = MealPlan.find_record(plan_id)
+    if record is None:
+        return None, 'Meal plan not found', 404
+    return record, None, 200
+
+
+def regenerate_part(record: dict, data) -> Tuple[Optional[dict], Optional[str], int]:
+    """
+    Regenerate or swap one day or one meal of a stored plan in place.
+    Returns (new day, None, 200) or (None, error message, status).
+    """
+    if not isinstance(data, dict):
+        return None, 'Request body is required', 400
+    
+    # Read, edit and write the day under the plan's lock, so concurrent
+    # edits of the same plan cannot overwrite each other
+    with MealPlan.lock(record['id']):
+        record = MealPlan.find_record(record['id'])
+        if record is None:
+            return None, 'Meal plan not found', 404
+        return _regenerate_part(record, data)
+
+
+def _regenerate_part(record: dict, data: dict) -> Tuple[Optional[dict], Optional[str], int]:
+    content = materialize(record)['plan_content']
+    days = content.get('days', []) if isinstance(content, dict) else []
+    day_number = data.get('day')
+    if not isinstance(day_number, int) or day_number < 1 or day_number > len(days):
+        return None, f'Day must be between 1 and {len(days)}', 400
+    
+    day_index = day_number - 1
+    day_plan = days[day_index]
+    target_calories = record['target_calories']
+    rng = random.Random()
+    meal_type = data.get('meal')
+    recipe_name = data.get('recipe')
+    
+    if meal_type is None:
+        if recipe_name is not None:
+            return None, 'recipe requires meal', 400
+        new_day = build_day(day_plan.get('day', day_number), rng, target_calories)
+    else:
+        if meal_type not in MEAL_SLOTS:
+            return None, f"Meal must be one of: {', '.join(MEAL_SLOTS)}", 400
+        
+        meal_index = next(
+            (i for i, meal in enumerate(day_plan['meals']) if meal.get('type') == meal_type),
+            None
+        )
+        if meal_index is None:
+            return None, f'Day {day_number} has no {meal_type}', 404
+        
+        if recipe_name is not None:
+            recipe = find_recipe(meal_type, recipe_name)
+            if recipe is None:
+                return None, f'Unknown {meal_type} recipe: {recipe_name}', 400
+        else:
+            recipe = pick_recipe(meal_type, rng, exclude=day_plan['meals'][meal_index]['name'])
+        
+        new_day = replace_meal(day_plan, meal_index, build_meal(meal_type, recipe, target_calories))
+    
+    error = validate_day(new_day)
+    if error:
+        return None, error, 400
+    
+    MealPlan.replace_day(record['id'], day_index, new_day)
+    return new_day, None, 200
+
+
+def run_generation(current_user, params: dict) -> Tuple[dict, int]:
+    """
+    Rate-limit, generate and store a plan for validated params.
+    Returns (response payload, status).
+    """
+    if not check_rate_limit(current_user['id']):
+        return {
+            'error': f'Rate limit exceeded. Please wait {RATE_LIMIT_SECONDS} seconds between requests.'
+        }, 429
+    
+    # Generate meal plan using OpenAI
+    try:
+        plan_content = generate_meal_plan(
+            params['days'], params['preferences'], params['servings'], params['target_calories'],
+            variety=params['variety'],
+            recent_recipes=history.recent_counts(current_user['id']) if params['variety'] else None
+        )
+    except Exception as e:
+        return {
+            'error': 'Failed to generate meal plan',
+            'details': str(e)
+        }, 500
+    
+    # Save to database
+    meal_plan = MealPlan.create(current_user['id'], {
+        'days': params['days'],
+        'preferences': params['preferences'],
+        'servings': params['servings'],
+        'target_calories': params['target_calories'],
+        'plan_content': plan_content
+    })
+    
+    return {
+        'message': 'Meal plan generated successfully',
+        'meal_plan': meal_plan
+    }, 201
+
+
+def generation_result(payload: dict, status: int):
+    """
+    What the idempotency store keeps of a generate response: the plan ID
+    on success, so the store does not hold every encoded plan.
+    """
+    if 200 <= status < 300:
+        return payload['meal_plan']['id']
+    return payload
+
+
+def replay_generation(status: int, result) -> Tuple[dict, int]:
+    """
+    Rebuild a generate response from an idempotency result.
+    Returns (response payload, status).
+    """
+    if not 200 <= status < 300:
+        return result, status
+    meal_plan = MealPlan.find_by_id(result)
+    if meal_plan is None:
+        return {'error': 'Meal plan was deleted'}, 410
+    return {
+        'message': 'Meal plan generated successfully',
+        'meal_plan': meal_plan
+    }, status
+
+
 @mealplans_bp.route('/generate', methods=['POST'])
 @token_required
 def generate(current_user):
@@ -40,64 +313,82 @@ def generate(current_user):
         "days": 7,
         "preferences": "Vegetarian, gluten-free",
         "servings": 2,
-        "target_calories": 2000
+        "target_calories": 2000,
+        "variety": true          (optional, avoid repeats and recent recipes)
     }
+    
+    Send an Idempotency-Key header to make retries safe: a repeated key
+    returns the original response instead of generating another plan.
     """
     try:
-        # Rate limiting
-        if not check_rate_limit(current_user['id']):
-            return jsonify({
-                'error': f'Rate limit exceeded. Please wait {RATE_LIMIT_SECONDS} seconds between requests.'
-            }), 429
+        params, error = validate_generate_request(request.get_json())
+        if error:
+            return jsonify({'error': error}), 400
         
-        data = request.get_json()
+        key = request.headers.get(idempotency.HEADER)
+        if key is None:
+            payload, status = run_generation(current_user, params)
+            return jsonify(payload), status
         
-        # Validate input
-        if not data:
-            return jsonify({'error': 'Request body is required'}), 400
+        error = idempotency.validate_key(key)
+        if error:
+            return jsonify({'error': error}), 400
         
-        days = data.get('days', 7)
-        preferences = data.get('preferences', 'No specific preferences')
-        servings = data.get('servings', 2)
-        target_calories = data.get('target_calories', 2000)
-        
-        # Validation
-        if not isinstance(days, int) or days < 1 or days > 30:
-            return jsonify({'error': 'Days must be between 1 and 30'}), 400
-        
-        if not isinstance(servings, int) or servings < 1 or servings > 10:
-            return jsonify({'error': 'Servings must be between 1 and 10'}), 400
+        try:
+            future, owner = idempotency.store.begin(
+                current_user['id'], key, idempotency.fingerprint(params)
+            )
+        except idempotency.IdempotencyConflict as e:
+            return jsonify({'error': str(e)}), 422
         
-        if not isinstance(target_calories, int) or target_calories < 500 or target_calories > 5000:
-            return jsonify({'error': 'Target calories must be between 500 and 5000'}), 400
+        if owner:
+            status, result = 500, {'error': 'Generation failed'}
+            try:
+                payload, status = run_generation(current_user, params)
+                result = generation_result(payload, status)
+            finally:
+                idempotency.store.finish(current_user['id'], key, status, result)
+            return jsonify(payload), status
         
-        # Generate meal plan using OpenAI
+        # Same key as an earlier or in-flight request: reuse its result
         try:
-            plan_content = generate_meal_plan(days, preferences, servings, target_calories)
-        except Exception as e:
+            status, result = future.result(timeout=idempotency.IDEMPOTENCY_WAIT_SECONDS)
+        except FutureTimeoutError:
             return jsonify({
-                'error': 'Failed to generate meal plan',
-                'details': str(e)
-            }), 500
-        
-        # Save to database
-        meal_plan = MealPlan.create(current_user['id'], {
-            'days': days,
-            'preferences': preferences,
-            'servings': servings,
-            'target_calories': target_calories,
-            'plan_content': plan_content
-        })
-        
-        return jsonify({
-            'message': 'Meal plan generated successfully',
-            'meal_plan': meal_plan
-        }), 201
+                'error': f'A request with this {idempotency.HEADER} is still in progress'
+            }), 409
+        payload, status = replay_generation(status, result)
+        return jsonify(payload), status, {idempotency.REPLAYED_HEADER: 'true'}
         
     except Exception as e:
         return jsonify({'error': f'Generation failed: {str(e)}'}), 500
 
 
+@mealplans_bp.route('/search', methods=['GET'])
+@token_required
+def search_plans(current_user):
+    """
+    Search recipes and the current user's meal plans.
+    
+    Query parameters:
+        q: search text, e.g. "lentils"
+        limit: maximum results per list (default 20, max 100)
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'Query parameter q is required'}), 400
+        
+        limit = request.args.get('limit', 20, type=int)
+        if limit < 1 or limit > 100:
+            return jsonify({'error': 'Limit must be between 1 and 100'}), 400
+        
+        results = search.search(current_user['id'], query, limit)
+        return jsonify({'query': query, **results}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @mealplans_bp.route('/', methods=['GET'])
 @token_required
 def get_all(current_user):
@@ -114,16 +405,15 @@ def get_all(current_user):
 def get_one(current_user, plan_id):
     """Get a specific meal plan."""
     try:
-        plan = MealPlan.find_by_id(plan_id)
-        
-        if not plan:
-            return jsonify({'error': 'Meal plan not found'}), 404
+        plan, error, status = find_owned_record(plan_id, current_user['id'])
+        if error:
+            return jsonify({'error': error}), status
         
-        # Check ownership
-        if plan['user_id'] != current_user['id']:
-            return jsonify({'error': 'Unauthorized access'}), 403
-        
-        return jsonify({'meal_plan': plan}), 200
+        # Plans are immutable after generation, so reuse the encoded body
+        return current_app.response_class(
+            encode_plan_response(plan),
+            mimetype='application/json'
+        ), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -133,14 +423,9 @@ def get_one(current_user, plan_id):
 def delete(current_user, plan_id):
     """Delete a meal plan."""
     try:
-        plan = MealPlan.find_by_id(plan_id)
-        
-        if not plan:
-            return jsonify({'error': 'Meal plan not found'}), 404
-        
-        # Check ownership
-        if plan['user_id'] != current_user['id']:
-            return jsonify({'error': 'Unauthorized access'}), 403
+        error, status = check_owner(plan_id, current_user['id'])
+        if error:
+            return jsonify({'error': error}), status
         
         MealPlan.delete(plan_id)
         
@@ -152,18 +437,17 @@ def delete(current_user, plan_id):
 @mealplans_bp.route('/<plan_id>', methods=['PUT'])
 @token_required
 def update(current_user, plan_id):
-    """Update a meal plan (for future use)."""
+    """Update a meal plan's parameters or content."""
     try:
-        plan = MealPlan.find_by_id(plan_id)
-        
-        if not plan:
-            return jsonify({'error': 'Meal plan not found'}), 404
-        
-        # Check ownership
-        if plan['user_id'] != current_user['id']:
-            return jsonify({'error': 'Unauthorized access'}), 403
+        plan, error, status = find_owned_record(plan_id, current_user['id'])
+        if error:
+            return jsonify({'error': error}), status
         
         data = request.get_json()
+        error = validate_plan_update(plan, data)
+        if error:
+            return jsonify({'error': error}), 400
+        
         updated_plan = MealPlan.update(plan_id, data)
         
         return jsonify({
@@ -172,3 +456,35 @@ def update(current_user, plan_id):
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+@mealplans_bp.route('/<plan_id>/regenerate', methods=['POST'])
+@token_required
+def regenerate(current_user, plan_id):
+    """
+    Regenerate or swap one day or one meal of a plan in place.
+    Only the affected day is rebuilt and its totals updated.
+    
+    Expected JSON:
+    {
+        "day": 3,
+        "meal": "Lunch",         (optional, whole day when omitted)
+        "recipe": "Lentil Soup"  (optional, random recipe when omitted)
+    }
+    """
+    try:
+        plan, error, status = find_owned_record(plan_id, current_user['id'])
+        if error:
+            return jsonify({'error': error}), status
+        
+        new_day, error, status = regenerate_part(plan, request.get_json())
+        if error:
+            return jsonify({'error': error}), status
+        
+        return jsonify({
+            'message': 'Meal plan updated successfully',
+            'plan_id': plan_id,
+            'day': new_day
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
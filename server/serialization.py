@@ -0,0 +1,113 @@
+"""
+JSON serialization for API responses.
+Uses orjson when it is installed and falls back to the stdlib encoder otherwise.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# Pre-encoded plan_content bytes, keyed by plan ID, most recently used last.
+# Bounded so the cache does not undo compact plan storage.
+PLAN_CACHE_SIZE = int(os.getenv('PLAN_CACHE_SIZE', 4096))
+plan_content_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_cache_lock = threading.Lock()
+# Bumped by every invalidation; bytes encoded across one are not cached
+_cache_generation = 0
+
+
+def dumps_bytes(obj) -> bytes:
+    """Encode an object to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(
+            obj,
+            default=DefaultJSONProvider.default,
+            option=orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(
+        obj,
+        default=DefaultJSONProvider.default,
+        separators=(",", ":"),
+        ensure_ascii=False
+    ).encode("utf-8")
+
+
+def loads(data):
+    """Decode JSON from str or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson when available."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
+
+
+def encode_plan_content(plan: dict) -> bytes:
+    """
+    Return the encoded plan_content for a plan or stored record, caching
+    the bytes. Compressed records are decompressed straight to JSON.
+    """
+    from plan_storage import encoded_content
+
+    plan_id = plan["id"]
+    with _cache_lock:
+        encoded = plan_content_cache.get(plan_id)
+        if encoded is not None:
+            plan_content_cache.move_to_end(plan_id)
+            return encoded
+        generation = _cache_generation
+
+    encoded = encoded_content(plan)
+    with _cache_lock:
+        # A write that landed while encoding may have made these bytes stale
+        if generation == _cache_generation:
+            plan_content_cache[plan_id] = encoded
+            if len(plan_content_cache) > PLAN_CACHE_SIZE:
+                plan_content_cache.popitem(last=False)
+    return encoded
+
+
+def encode_plan_response(plan: dict, key: str = "meal_plan") -> bytes:
+    """
+    Encode {key: plan} while reusing the cached plan_content bytes.
+    Only the small metadata fields are encoded on each call.
+    """
+    meta = {k: v for k, v in plan.items() if k not in ("plan_content", "plan_blob")}
+    return b"".join([
+        b'{"', key.encode("utf-8"), b'":',
+        dumps_bytes(meta)[:-1],
+        b',"plan_content":' if meta else b'"plan_content":',
+        encode_plan_content(plan),
+        b"}}"
+    ])
+
+
+def invalidate_plan(plan_id: str):
+    """Drop cached bytes for a plan after it changes or is deleted."""
+    global _cache_generation
+    with _cache_lock:
+        _cache_generation += 1
+        plan_content_cache.pop(plan_id, None)
@@ -0,0 +1,138 @@
+"""
+System-wide plan analytics maintained incrementally.
+
+Every plan added to or removed from the store adjusts a few counters:
+plans per recipe, histograms of target calories and plan length, and
+plans created per day. Reading the rollups costs O(buckets), never a
+scan of meal_plans_db.
+
+Recipes are counted once per plan that uses them, not once per meal:
+records carry the set of recipe names but not their content, and
+counting meals would mean decoding every plan as it is stored.
+
+Set ANALYTICS_SNAPSHOT_PATH to append a timestamped copy of the rollups
+to a JSON lines file every ANALYTICS_SNAPSHOT_SECONDS.
+"""
+
+import heapq
+import os
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from serialization import dumps_bytes
+
+CALORIE_BUCKET = 250
+ANALYTICS_SNAPSHOT_PATH = os.getenv('ANALYTICS_SNAPSHOT_PATH')
+ANALYTICS_SNAPSHOT_SECONDS = float(os.getenv('ANALYTICS_SNAPSHOT_SECONDS', 3600))
+
+# Recipe name -> number of plans using it
+recipe_plans = Counter()
+# Lower bound of a CALORIE_BUCKET-wide range -> plans
+target_calories = Counter()
+# Plan length in days -> plans
+plan_days = Counter()
+# Creation date (YYYY-MM-DD) -> plans
+plans_per_day = Counter()
+totals = {"plans": 0}
+
+_lock = threading.Lock()
+
+
+def _apply(record: dict, delta: int):
+    with _lock:
+        totals["plans"] += delta
+        for name in record.get("recipes", ()):
+            recipe_plans[name] += delta
+            if recipe_plans[name] <= 0:
+                del recipe_plans[name]
+        for counter, key in (
+            (target_calories, _calorie_bucket(record.get("target_calories"))),
+            (plan_days, record.get("days")),
+            (plans_per_day, (record.get("created_at") or "")[:10] or None),
+        ):
+            if key is None:
+                continue
+            counter[key] += delta
+            if counter[key] <= 0:
+                del counter[key]
+
+
+def _calorie_bucket(calories) -> Optional[int]:
+    if not isinstance(calories, int):
+        return None
+    return calories // CALORIE_BUCKET * CALORIE_BUCKET
+
+
+def add_plan(record: dict):
+    """Count a plan that entered the store."""
+    _apply(record, 1)
+
+
+def remove_plan(record: dict):
+    """Uncount a plan that left the store (or is about to change)."""
+    _apply(record, -1)
+
+
+def clear():
+    with _lock:
+        for counter in (recipe_plans, target_calories, plan_days, plans_per_day):
+            counter.clear()
+        totals["plans"] = 0
+
+
+def rollups(top_recipes: int = 20) -> dict:
+    """Current rollups, with the top_recipes recipes used by the most plans."""
+    with _lock:
+        top = heapq.nlargest(top_recipes, recipe_plans.items(), key=lambda item: (item[1], item[0]))
+        return {
+            "total_plans": totals["plans"],
+            "distinct_recipes": len(recipe_plans),
+            "top_recipes_by_plans": [{"name": name, "plans": count} for name, count in top],
+            "target_calories": [
+                {"min": bucket, "max": bucket + CALORIE_BUCKET - 1, "plans": count}
+                for bucket, count in sorted(target_calories.items())
+            ],
+            "days": [{"days": days, "plans": count} for days, count in sorted(plan_days.items())],
+            "plans_per_day": dict(sorted(plans_per_day.items()))
+        }
+
+
+class SnapshotWriter:
+    """Background thread appending rollups to a JSON lines file."""
+
+    def __init__(self, path: str, interval: float):
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._start()
+        # Threads do not survive gunicorn's fork after preloading the app
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='analytics-snapshots', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        line = dumps_bytes({"at": datetime.utcnow().isoformat(), **rollups(top_recipes=100)})
+        with open(self.path, 'ab') as f:
+            f.write(line + b"\n")
+
+    def stop(self):
+        self._stop.set()
+
+
+snapshot_writer: Optional[SnapshotWriter] = None
+
+
+def start_snapshots():
+    """Start periodic snapshots if ANALYTICS_SNAPSHOT_PATH is set."""
+    global snapshot_writer
+    if ANALYTICS_SNAPSHOT_PATH and snapshot_writer is None and ANALYTICS_SNAPSHOT_SECONDS > 0:
+        snapshot_writer = SnapshotWriter(ANALYTICS_SNAPSHOT_PATH, ANALYTICS_SNAPSHOT_SECONDS)
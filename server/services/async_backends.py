@@ -0,0 +1,59 @@
+"""
+Async storage and model-backend interfaces for the ASGI server path.
+
+The in-memory store blocks more than it looks: reads decompress or
+rebuild plan content and can thaw cold plans from disk, writes wait for
+the operation log fsync when DATA_DIR is set, and edits take per-plan
+locks. The local recipe generator is CPU-bound. So the default
+implementations run on the default executor to keep the event loop free.
+A networked database or an HTTP model backend can implement the same
+coroutines and be awaited without tying up a worker thread per request.
+"""
+
+import asyncio
+from typing import List, Optional
+
+from models import MealPlan
+from services.openai_service import generate_meal_plan
+
+
+class AsyncMealPlanStore:
+    """Async facade over the MealPlan model."""
+
+    async def create(self, user_id: str, plan_data: dict) -> dict:
+        return await asyncio.to_thread(MealPlan.create, user_id, plan_data)
+
+    async def find_by_user(self, user_id: str) -> List[dict]:
+        return await asyncio.to_thread(MealPlan.find_by_user, user_id)
+
+    async def find_by_id(self, plan_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(MealPlan.find_by_id, plan_id)
+
+    async def find_record(self, plan_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(MealPlan.find_record, plan_id)
+
+    async def update(self, plan_id: str, updates: dict) -> Optional[dict]:
+        return await asyncio.to_thread(MealPlan.update, plan_id, updates)
+
+    async def delete(self, plan_id: str) -> bool:
+        return await asyncio.to_thread(MealPlan.delete, plan_id)
+
+
+class AsyncModelClient:
+    """
+    Async interface to the meal plan generator.
+    Subclasses talking to a remote model should override generate()
+    with an awaitable HTTP call (e.g. httpx.AsyncClient).
+    """
+
+    async def generate(self, days: int, preferences: str, servings: int,
+                       target_calories: int, variety: bool = False,
+                       recent_recipes: Optional[dict] = None) -> dict:
+        return await asyncio.to_thread(
+            generate_meal_plan, days, preferences, servings, target_calories,
+            variety=variety, recent_recipes=recent_recipes
+        )
+
+    async def aclose(self):
+        """Release any pooled connections."""
+        return None
@@ -0,0 +1,422 @@
+"""
+Memory-mapped on-disk recipe catalog.
+
+The catalog file holds numeric recipe fields as fixed-width columns and
+all text in one string table addressed by an offset index. Recipes are
+sorted by category, so each category is a contiguous ID range, and each
+tag has a posting list of recipe IDs. The file is mapped read-only, so
+every worker process shares one copy in the page cache, and recipes are
+decoded only when they are picked.
+
+Build a catalog from a JSON file shaped like MEAL_DATABASE
+({category: [recipe, ...]}) or from the built-in recipes:
+    python -m services.catalog build catalog.bin [--source recipes.json]
+
+Then point the server at it with RECIPE_CATALOG_PATH=catalog.bin.
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MAGIC = b"MPCATLG1"
+# Magic, manifest length
+_HEADER = struct.Struct("<8sI")
+_ALIGN = 8
+
+# Numeric columns: name -> array typecode
+COLUMNS = {
+    "calories": "I",
+    "protein": "f",
+    "carbs": "f",
+    "fat": "f",
+}
+MACROS = ("protein", "carbs", "fat")
+
+# Text fields per recipe, in string-table order
+STRING_FIELDS = ("name", "instructions", "ingredients", "tags")
+LIST_SEPARATOR = "\n"
+
+# Seconds between checks of the catalog file for changes
+RELOAD_INTERVAL = float(os.getenv("RECIPE_CATALOG_RELOAD_SECONDS", 2))
+# Earlier catalog versions kept mapped for rebuilding seed-mode plans
+PINNED_CATALOGS = int(os.getenv("RECIPE_CATALOG_PINNED", 4))
+
+
+def parse_grams(value):
+    """Parse a macro amount like "12g" into grams."""
+    if isinstance(value, (int, float)):
+        return value
+    grams = float(str(value).strip().rstrip("g") or 0)
+    return int(grams) if grams.is_integer() else grams
+
+
+def format_grams(value: float) -> str:
+    """Format grams the way the recipe catalog writes them ("12g")."""
+    return f"{int(value)}g" if float(value).is_integer() else f"{value:g}g"
+
+
+def _pad(buffer: bytearray):
+    buffer.extend(b"\0" * (-len(buffer) % _ALIGN))
+
+
+def build_catalog(recipes_by_category: Dict[str, List[dict]], output_path: str) -> str:
+    """
+    Write a catalog file from {category: [recipe, ...]}.
+    Returns the catalog version (a content hash).
+    """
+    recipes = []
+    categories = {}
+    for category, items in recipes_by_category.items():
+        start = len(recipes)
+        recipes.extend(items)
+        categories[category] = [start, len(recipes)]
+
+    count = len(recipes)
+    body = bytearray()
+    sections = {}
+
+    for column, typecode in COLUMNS.items():
+        sections[column] = len(body)
+        fmt = f"<{count}{typecode}"
+        if column == "calories":
+            values = [int(recipe["calories"]) for recipe in recipes]
+        else:
+            values = [parse_grams(recipe[column]) for recipe in recipes]
+        body.extend(struct.pack(fmt, *values))
+        _pad(body)
+
+    # String table: one offset per field per recipe, plus an end offset
+    strings = bytearray()
+    offsets = []
+    for recipe in recipes:
+        for field in STRING_FIELDS:
+            value = recipe.get(field, "")
+            if isinstance(value, (list, tuple)):
+                value = LIST_SEPARATOR.join(value)
+            offsets.append(len(strings))
+            strings.extend(value.encode("utf-8"))
+    offsets.append(len(strings))
+    sections["string_offsets"] = len(body)
+    body.extend(struct.pack(f"<{len(offsets)}Q", *offsets))
+    _pad(body)
+    sections["strings"] = len(body)
+    body.extend(strings)
+    _pad(body)
+
+    # Tag postings: recipe IDs per tag
+    postings: Dict[str, List[int]] = {}
+    for recipe_id, recipe in enumerate(recipes):
+        for tag in recipe.get("tags", []):
+            postings.setdefault(tag, []).append(recipe_id)
+    sections["tag_postings"] = len(body)
+    tags = {}
+    position = 0
+    for tag, ids in sorted(postings.items()):
+        tags[tag] = [position, len(ids)]
+        body.extend(struct.pack(f"<{len(ids)}I", *ids))
+        position += len(ids)
+    _pad(body)
+
+    version = hashlib.blake2b(bytes(body), digest_size=4).hexdigest()
+    manifest = json.dumps({
+        "version": version,
+        "count": count,
+        "categories": categories,
+        "tags": tags,
+        "sections": sections,
+    }).encode("utf-8")
+    header = bytearray(_HEADER.pack(MAGIC, len(manifest)) + manifest)
+    _pad(header)
+
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(body)
+    os.replace(tmp_path, output_path)
+    return version
+
+
+class CategoryView(Sequence):
+    """Lazy, read-only sequence of the recipes in one category."""
+
+    def __init__(self, catalog: "RecipeCatalog", start: int, end: int):
+        self._catalog = catalog
+        self._start = start
+        self._end = end
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("recipe index out of range")
+        return self._catalog.recipe(self._start + index)
+
+
+class RecipeCatalog(Mapping):
+    """
+    Read-only view of a catalog file, usable wherever MEAL_DATABASE is:
+    catalog["lunches"] is a sequence of recipe dicts.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, manifest_length = _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a recipe catalog file")
+        manifest_end = _HEADER.size + manifest_length
+        manifest = json.loads(self._mmap[_HEADER.size:manifest_end])
+        body = manifest_end + (-manifest_end % _ALIGN)
+
+        self.version = manifest["version"]
+        self.count = manifest["count"]
+        self.categories = {name: tuple(bounds) for name, bounds in manifest["categories"].items()}
+        self.tags = {name: tuple(bounds) for name, bounds in manifest["tags"].items()}
+
+        view = memoryview(self._mmap)
+        sections = manifest["sections"]
+        self._columns = {}
+        for column, typecode in COLUMNS.items():
+            start = body + sections[column]
+            self._columns[column] = view[start:start + 4 * self.count].cast(typecode)
+        start = body + sections["string_offsets"]
+        n_offsets = self.count * len(STRING_FIELDS) + 1
+        self._offsets = view[start:start + 8 * n_offsets].cast("Q")
+        self._strings = body + sections["strings"]
+        start = body + sections["tag_postings"]
+        n_postings = sum(length for _, length in self.tags.values())
+        self._postings = view[start:start + 4 * n_postings].cast("I")
+        self._views = {name: CategoryView(self, *bounds) for name, bounds in self.categories.items()}
+        self._name_index: Optional[Dict[str, Dict[str, int]]] = None
+
+    def _string(self, recipe_id: int, field_index: int) -> str:
+        slot = recipe_id * len(STRING_FIELDS) + field_index
+        start = self._strings + self._offsets[slot]
+        end = self._strings + self._offsets[slot + 1]
+        return self._mmap[start:end].decode("utf-8")
+
+    def recipe(self, recipe_id: int) -> dict:
+        """Decode one recipe into the MEAL_DATABASE dict shape."""
+        ingredients = self._string(recipe_id, 2)
+        tags = self._string(recipe_id, 3)
+        recipe = {
+            "name": self._string(recipe_id, 0),
+            "ingredients": ingredients.split(LIST_SEPARATOR) if ingredients else [],
+            "calories": self._columns["calories"][recipe_id],
+        }
+        for macro in MACROS:
+            recipe[macro] = format_grams(self._columns[macro][recipe_id])
+        recipe["instructions"] = self._string(recipe_id, 1)
+        if tags:
+            recipe["tags"] = tags.split(LIST_SEPARATOR)
+        return recipe
+
+    def with_tag(self, tag: str) -> List[int]:
+        """Recipe IDs carrying a tag."""
+        start, length = self.tags.get(tag, (0, 0))
+        return list(self._postings[start:start + length])
+
+    def find_recipe(self, category: str, name: str) -> Optional[dict]:
+        """Look up a recipe by name within a category."""
+        if self._name_index is None:
+            index = {}
+            for cat, (start, end) in self.categories.items():
+                index[cat] = {self._string(i, 0): i for i in range(start, end)}
+            self._name_index = index
+        recipe_id = self._name_index.get(category, {}).get(name)
+        return self.recipe(recipe_id) if recipe_id is not None else None
+
+    def __getitem__(self, category: str) -> CategoryView:
+        return self._views[category]
+
+    def __iter__(self):
+        return iter(self._views)
+
+    def __len__(self):
+        return len(self._views)
+
+
+class CatalogArchive:
+    """
+    Durable copies of catalog versions, one file per version in a
+    directory. Seed-mode plans only store a catalog version, so a copy of
+    it must outlive the catalog file being replaced and the server
+    restarting.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def path(self, version: str) -> Path:
+        return self.directory / f"{version}.bin"
+
+    def has(self, version: str) -> bool:
+        return self.path(version).exists()
+
+    def save(self, catalog: "RecipeCatalog"):
+        """Durably copy a mapped catalog, unless that version is already saved."""
+        path = self.path(catalog.version)
+        if path.exists():
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(catalog._mmap)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def load(self, version: str) -> Optional["RecipeCatalog"]:
+        try:
+            return RecipeCatalog(str(self.path(version)))
+        except FileNotFoundError:
+            return None
+
+
+class CatalogHandle(Mapping):
+    """
+    Catalog that follows its file: when the file is replaced, the next
+    access after RELOAD_INTERVAL maps the new version. Every version it
+    maps is copied to the archive, if there is one, and pinned() maps
+    earlier versions from there so plans generated from them can still be
+    rebuilt. At most max_pinned earlier versions stay mapped.
+    """
+
+    def __init__(self, path: str, reload_interval: float = RELOAD_INTERVAL,
+                 archive: Optional[CatalogArchive] = None, max_pinned: int = PINNED_CATALOGS):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.archive = archive
+        self.max_pinned = max_pinned
+        self._lock = threading.Lock()
+        self._mtime = os.stat(path).st_mtime_ns
+        self._catalog = RecipeCatalog(path)
+        self._save(self._catalog)
+        # Earlier versions, least recently used first
+        self._pinned: "OrderedDict[str, RecipeCatalog]" = OrderedDict()
+        self._next_check = time.monotonic() + reload_interval
+
+    def _save(self, catalog: "RecipeCatalog"):
+        if self.archive is not None:
+            try:
+                self.archive.save(catalog)
+            except OSError as e:
+                # Plans from this version are stored in full instead
+                print(f"Recipe catalog archive failed: {e}")
+
+    @property
+    def current(self) -> RecipeCatalog:
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    self._next_check = now + self.reload_interval
+                    try:
+                        mtime = os.stat(self.path).st_mtime_ns
+                        if mtime != self._mtime:
+                            catalog = RecipeCatalog(self.path)
+                            self._save(catalog)
+                            self._pin(self._catalog)
+                            self._catalog = catalog
+                            self._mtime = mtime
+                    except (OSError, ValueError):
+                        # Keep serving the mapped catalog if the new file is unreadable
+                        pass
+        return self._catalog
+
+    def _pin(self, catalog: "RecipeCatalog"):
+        self._pinned[catalog.version] = catalog
+        self._pinned.move_to_end(catalog.version)
+        while len(self._pinned) > self.max_pinned:
+            # Views handed out earlier keep their mapping alive until dropped
+            self._pinned.popitem(last=False)
+
+    @property
+    def version(self) -> str:
+        return self.current.version
+
+    def is_durable(self, version: str) -> bool:
+        """Whether a version can still be mapped after a restart."""
+        return self.archive is not None and self.archive.has(version)
+
+    def pinned(self, version: str) -> Optional[RecipeCatalog]:
+        """A catalog version, mapped from the archive if needed, or None."""
+        current = self.current
+        if version == current.version:
+            return current
+        with self._lock:
+            catalog = self._pinned.get(version)
+            if catalog is None and self.archive is not None:
+                catalog = self.archive.load(version)
+            if catalog is not None:
+                self._pin(catalog)
+            return catalog
+
+    def find_recipe(self, category: str, name: str) -> Optional[dict]:
+        return self.current.find_recipe(category, name)
+
+    def with_tag(self, tag: str) -> List[int]:
+        return self.current.with_tag(tag)
+
+    def __getitem__(self, category: str) -> CategoryView:
+        return self.current[category]
+
+    def __iter__(self):
+        return iter(self.current)
+
+    def __len__(self):
+        return len(self.current)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recipe catalog tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="build a catalog file")
+    build.add_argument("output")
+    build.add_argument("--source", help="JSON file of {category: [recipe, ...]} "
+                                        "(default: the built-in recipes)")
+    build.add_argument("--keep-nutrition", action="store_true",
+                       help="use the recipes' own calories and macros instead of "
+                            "computing them from their ingredients")
+    build.add_argument("--tolerance", type=float, default=None,
+                       help="keep a recipe's own nutrition when the computed calories differ "
+                            "from its stated calories by more than this fraction "
+                            "(default: always use computed nutrition)")
+    args = parser.parse_args()
+
+    if args.source:
+        with open(args.source) as f:
+            recipes = json.load(f)
+    else:
+        from services.openai_service import STATED_MEAL_DATABASE
+        recipes = STATED_MEAL_DATABASE
+
+    if not args.keep_nutrition:
+        from services.nutrition import apply_to_catalog
+        recipes, notes = apply_to_catalog(recipes, args.tolerance)
+        for name, note in notes:
+            print(f"{name}: {note}")
+
+    version = build_catalog(recipes, args.output)
+    count = sum(len(items) for items in recipes.values())
+    print(f"Wrote {count} recipes to {args.output} (version {version})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Per-user recent-recipe history used for variety-aware generation.
+
+Each user has a small sketch of decayed recipe frequencies: every new
+plan multiplies existing counts by DECAY and adds one per recipe it
+uses, and only the CAPACITY heaviest recipes are kept. Generation reads
+the sketch instead of loading old plans.
+"""
+
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable
+
+DECAY = 0.6
+CAPACITY = 48
+# Entries lighter than this are dropped
+MIN_WEIGHT = 0.05
+
+
+class RecentRecipeSketch:
+    """Bounded, exponentially decayed recipe frequency counter."""
+
+    __slots__ = ("counts",)
+
+    def __init__(self):
+        self.counts: Dict[str, float] = {}
+
+    def add_plan(self, recipe_names: Iterable[str]):
+        counts = {name: weight * DECAY for name, weight in self.counts.items()
+                  if weight * DECAY >= MIN_WEIGHT}
+        for name in recipe_names:
+            counts[name] = counts.get(name, 0.0) + 1.0
+        if len(counts) > CAPACITY:
+            counts = dict(sorted(counts.items(), key=lambda item: -item[1])[:CAPACITY])
+        self.counts = counts
+
+
+user_recent_recipes: Dict[str, RecentRecipeSketch] = defaultdict(RecentRecipeSketch)
+_lock = threading.Lock()
+
+
+def record_plan(user_id: str, recipe_names: Iterable[str]):
+    """Fold a newly created plan into its owner's history."""
+    with _lock:
+        user_recent_recipes[user_id].add_plan(recipe_names)
+
+
+def recent_counts(user_id: str) -> Dict[str, float]:
+    """Decayed recipe counts for a user (a copy, safe to read while generating)."""
+    sketch = user_recent_recipes.get(user_id)
+    return dict(sketch.counts) if sketch is not None else {}
+
+
+def clear():
+    user_recent_recipes.clear()
@@ -0,0 +1,291 @@
+"""
+Ingredient-level nutrition.
+
+NUTRITION_TABLE maps a normalized ingredient name to its calories and
+macros per 100 g, plus how many grams one cup and one piece (slice,
+clove, scoop, ...) weigh. Ingredient lines such as "1/2 cup mixed berries
+(strawberries, blueberries)" are parsed into a quantity, a unit and a
+table key, so a recipe's calories and macros can be computed from its
+ingredients. This runs once for the built-in recipes, at import, and
+once when a catalog file is built:
+    python -m services.catalog build catalog.bin --source recipes.json
+
+Ingredient amounts are per serving unless a recipe has a "servings"
+field. Lines without a quantity ("Salt and pepper to taste") and
+optional ingredients are not counted.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from services.catalog import MACROS, format_grams, parse_grams
+
+# name -> (kcal, protein g, carbs g, fat g per 100 g, grams per cup, grams per piece)
+NUTRITION_TABLE: Dict[str, Tuple[float, float, float, float, Optional[float], Optional[float]]] = {
+    "almond": (579, 21.2, 21.6, 49.9, 143, 1.2),
+    "almond butter": (614, 21.0, 18.8, 55.5, 256, None),
+    "almond milk": (15, 0.6, 0.3, 1.2, 240, None),
+    "apple": (52, 0.3, 13.8, 0.2, 125, 182),
+    "avocado": (160, 2.0, 8.5, 14.7, 150, 150),
+    "banana": (89, 1.1, 22.8, 0.3, 150, 118),
+    "berry": (50, 0.7, 12.0, 0.3, 148, None),
+    "black bean": (132, 8.9, 23.7, 0.5, 172, None),
+    "brown rice": (123, 2.7, 25.6, 1.0, 195, None),
+    "butter": (717, 0.9, 0.1, 81.1, 227, None),
+    "carrot": (41, 0.9, 9.6, 0.2, 128, 61),
+    "celery": (16, 0.7, 3.0, 0.2, 101, 40),
+    "cherry tomato": (18, 0.9, 3.9, 0.2, 149, 17),
+    "chia seed": (486, 16.5, 42.1, 30.7, 170, None),
+    "chicken breast": (165, 31.0, 0.0, 3.6, 140, 170),
+    "chickpea": (164, 8.9, 27.4, 2.6, 164, None),
+    "coconut milk": (230, 2.3, 5.5, 23.8, 226, None),
+    "corn": (96, 3.4, 21.0, 1.5, 145, None),
+    "cucumber": (15, 0.7, 3.6, 0.1, 119, 300),
+    "curry paste": (130, 2.0, 15.0, 7.0, 256, None),
+    "dark chocolate chip": (500, 5.0, 60.0, 30.0, 168, None),
+    "dried apricot": (241, 3.4, 62.6, 0.5, 130, 7),
+    "egg": (143, 12.6, 0.7, 9.5, 243, 50),
+    "feta cheese": (264, 14.2, 4.1, 21.3, 150, None),
+    "garlic": (149, 6.4, 33.1, 0.5, 136, 3),
+    "ginger": (80, 1.8, 17.8, 0.8, 96, None),
+    "granola": (471, 10.0, 64.0, 20.0, 122, None),
+    "greek yogurt": (73, 10.0, 3.9, 1.9, 245, None),
+    "honey": (304, 0.3, 82.4, 0.0, 339, None),
+    "hummus": (166, 7.9, 14.3, 9.6, 246, None),
+    "lemon": (29, 1.1, 9.3, 0.3, 212, 58),
+    "lemon juice": (22, 0.4, 6.9, 0.2, 244, None),
+    "lemon vinaigrette": (320, 0.2, 8.0, 32.0, 240, None),
+    "lentil": (116, 9.0, 20.1, 0.4, 198, None),
+    "lettuce": (15, 1.4, 2.9, 0.2, 36, 10),
+    "maple syrup": (260, 0.0, 67.0, 0.1, 315, None),
+    "milk": (50, 3.3, 4.8, 2.0, 244, None),
+    "mixed green": (20, 1.8, 3.2, 0.3, 36, None),
+    "mixed nut": (607, 20.0, 21.0, 54.0, 134, None),
+    "mixed vegetable": (65, 2.9, 13.1, 0.2, 150, None),
+    "olive oil": (884, 0.0, 0.0, 100.0, 216, None),
+    "olive oil dressing": (320, 0.2, 8.0, 32.0, 240, None),
+    "onion": (40, 1.1, 9.3, 0.1, 160, 110),
+    "parmesan": (431, 38.0, 4.1, 28.6, 100, None),
+    "parsley": (36, 3.0, 6.3, 0.8, 60, None),
+    "peanut butter": (588, 25.1, 20.0, 50.4, 258, None),
+    "protein powder": (400, 80.0, 8.0, 5.0, None, 30),
+    "quinoa": (120, 4.4, 21.3, 1.9, 185, None),
+    "red onion": (40, 1.1, 9.3, 0.1, 160, 110),
+    "red pepper flake": (318, 12.0, 56.6, 17.3, 88, None),
+    "rolled oat": (379, 13.2, 67.7, 6.5, 81, None),
+    "salmon fillet": (208, 20.4, 0.0, 13.4, None, 150),
+    "salsa": (36, 1.5, 6.6, 0.2, 259, None),
+    "sesame oil": (884, 0.0, 0.0, 100.0, 218, None),
+    "sesame seed": (573, 17.7, 23.4, 49.7, 144, None),
+    "soy sauce": (53, 8.1, 4.9, 0.6, 255, None),
+    "spinach": (23, 2.9, 3.6, 0.4, 30, None),
+    "stir-fry sauce": (100, 2.0, 20.0, 1.0, 272, None),
+    "tofu": (144, 15.8, 2.8, 8.7, 252, None),
+    "tomato sauce": (50, 1.5, 8.0, 1.5, 245, None),
+    "turkey breast": (104, 17.0, 4.0, 2.0, 140, 28),
+    "vegetable broth": (5, 0.2, 0.9, 0.1, 240, None),
+    "vegetable stick": (30, 1.0, 6.5, 0.2, 120, None),
+    "walnut": (654, 15.2, 13.7, 65.2, 117, 4),
+    "water": (0, 0.0, 0.0, 0.0, 237, None),
+    "whole wheat bread": (252, 12.5, 42.7, 3.5, None, 32),
+    "whole wheat pasta": (352, 14.6, 71.9, 2.5, 105, None),
+    "whole wheat pita": (266, 9.8, 55.0, 2.6, None, 64),
+    "whole wheat tortilla": (300, 9.0, 49.0, 7.5, None, 45),
+}
+
+# Other spellings of table entries (after normalization)
+ALIASES = {
+    "nut": "mixed nut",
+    "oat": "rolled oat",
+    "mixed berry": "berry",
+    "whole grain bread": "whole wheat bread",
+    "grated parmesan": "parmesan",
+    "roasted vegetable": "mixed vegetable",
+    "salmon": "salmon fillet",
+}
+
+# Largest relative difference between computed and stated calories per
+# serving that apply_to_catalog passes without a note; beyond it the
+# ingredient list or the stated figure is probably off for that recipe
+NUTRITION_TOLERANCE = 0.2
+
+# Units measured by weight (grams per unit) or by volume (fraction of a cup)
+WEIGHT_UNITS = {"g": 1.0, "gram": 1.0, "kg": 1000.0, "oz": 28.35, "lb": 453.6}
+VOLUME_UNITS = {"cup": 1.0, "tbsp": 1 / 16, "tablespoon": 1 / 16, "tsp": 1 / 48, "teaspoon": 1 / 48}
+PIECE_UNITS = {"slice", "clove", "scoop", "leaf", "stalk", "piece", "fillet"}
+
+# Words that describe an ingredient without changing what it is
+DESCRIPTORS = {
+    "chopped", "diced", "minced", "sliced", "fresh", "cooked", "grated", "shredded",
+    "poached", "frozen", "large", "medium", "small", "ripe", "lean", "plain", "raw",
+}
+
+_QUANTITY_RE = re.compile(r"^\s*(\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?)\s*([a-z]+\b)?\s*(.*)$")
+
+
+def _number(text: str) -> float:
+    total = 0.0
+    for part in text.split():
+        if "/" in part:
+            numerator, denominator = part.split("/")
+            total += int(numerator) / int(denominator)
+        else:
+            total += float(part)
+    return total
+
+
+IRREGULAR_PLURALS = {"leaves": "leaf", "loaves": "loaf", "halves": "half"}
+
+
+def _singular(word: str) -> str:
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("oes"):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us")) and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def normalize(name: str) -> str:
+    """Normalize an ingredient name into a table key."""
+    name = re.sub(r"\([^)]*\)", "", name.lower())
+    name = name.split(",")[0]
+    # "milk or water" -> "milk"
+    name = name.split(" or ")[0]
+    words = [_singular(word) for word in name.split() if word not in DESCRIPTORS]
+    return " ".join(words)
+
+
+def parse_ingredient(line: str) -> Optional[Tuple[float, str, str]]:
+    """
+    Split an ingredient line into (quantity, unit, key). The unit is
+    "g", "cup" or "piece". Returns None for lines without a quantity and
+    optional ingredients.
+    """
+    if "optional" in line.lower():
+        return None
+    match = _QUANTITY_RE.match(line.lower())
+    if not match:
+        return None
+    quantity = _number(match.group(1))
+    unit = _singular(match.group(2) or "")
+    rest = match.group(3)
+
+    if unit in WEIGHT_UNITS:
+        return quantity * WEIGHT_UNITS[unit], "g", normalize(rest)
+    if unit in VOLUME_UNITS:
+        return quantity * VOLUME_UNITS[unit], "cup", normalize(rest)
+    if unit in PIECE_UNITS:
+        return quantity, "piece", normalize(rest)
+
+    # No unit: the word after the number is part of the name ("2 large eggs")
+    key = normalize(f"{match.group(2) or ''} {rest}")
+    # "1 celery stalk" counts stalks of celery
+    words = key.split()
+    if len(words) > 1 and words[-1] in PIECE_UNITS:
+        key = " ".join(words[:-1])
+    return quantity, "piece", key
+
+
+def lookup(key: str):
+    """Table entry for a normalized name, or None."""
+    entry = NUTRITION_TABLE.get(key)
+    if entry is None and key in ALIASES:
+        entry = NUTRITION_TABLE[ALIASES[key]]
+    return entry
+
+
+def ingredient_nutrition(line: str) -> Optional[Tuple[float, float, float, float]]:
+    """
+    (calories, protein, carbs, fat) for one ingredient line. Lines that
+    are not counted give zeros; lines that cannot be resolved give None.
+    """
+    parsed = parse_ingredient(line)
+    if parsed is None:
+        return (0.0, 0.0, 0.0, 0.0)
+    quantity, unit, key = parsed
+    entry = lookup(key)
+    if entry is None:
+        return None
+    *per_100g, cup_grams, piece_grams = entry
+    if unit == "g":
+        grams = quantity
+    elif unit == "cup" and cup_grams is not None:
+        grams = quantity * cup_grams
+    elif unit == "piece" and piece_grams is not None:
+        grams = quantity * piece_grams
+    else:
+        return None
+    return tuple(value * grams / 100 for value in per_100g)
+
+
+def recipe_nutrition(ingredients: List[str], servings: int = 1) -> Tuple[dict, List[str]]:
+    """
+    Sum a recipe's nutrition per serving from its ingredient lines, which
+    make `servings` servings.
+    Returns (nutrition in catalog form, unresolved lines).
+    """
+    totals = [0.0, 0.0, 0.0, 0.0]
+    unresolved = []
+    for line in ingredients:
+        values = ingredient_nutrition(line)
+        if values is None:
+            unresolved.append(line)
+            continue
+        for i, value in enumerate(values):
+            totals[i] += value / servings
+    calories, *macros = totals
+    nutrition = {"calories": int(round(calories))}
+    for name, grams in zip(MACROS, macros):
+        nutrition[name] = format_grams(round(grams))
+    return nutrition, unresolved
+
+
+def apply_to_catalog(recipes_by_category: dict,
+                     tolerance: Optional[float] = None) -> Tuple[dict, List[Tuple[str, str]]]:
+    """
+    Return a copy of a catalog with calories and macros computed from
+    ingredients. A recipe's ingredients make recipe["servings"] servings
+    (default 1). Recipes with an unknown ingredient keep their own values.
+    Computed calories more than NUTRITION_TOLERANCE away from the ones a
+    recipe states are used but reported; with `tolerance` set, recipes
+    beyond it keep their own values instead. The second element lists
+    (recipe name, note) for every recipe that was reported or kept.
+    """
+    catalog = {}
+    notes = []
+    for category, recipes in recipes_by_category.items():
+        catalog[category] = []
+        for recipe in recipes:
+            nutrition, unresolved = recipe_nutrition(recipe.get("ingredients", []),
+                                                     recipe.get("servings") or 1)
+            stated = recipe.get("calories")
+            difference = abs(nutrition["calories"] - stated) / stated if stated else 0
+            if unresolved:
+                notes.append((recipe["name"], f"kept its own nutrition; unknown ingredients: "
+                                              f"{'; '.join(unresolved)}"))
+                catalog[category].append(recipe)
+            elif tolerance is not None and difference > tolerance:
+                notes.append((recipe["name"], f"kept its own nutrition; computed "
+                                              f"{nutrition['calories']} kcal per serving but it states {stated}"))
+                catalog[category].append(recipe)
+            else:
+                if difference > NUTRITION_TOLERANCE:
+                    notes.append((recipe["name"], f"computed {nutrition['calories']} kcal per serving, "
+                                                  f"replacing the stated {stated}"))
+                catalog[category].append({**recipe, **nutrition})
+    return catalog, notes
+
+
+def scale_nutrition(recipe: dict, factor: float) -> dict:
+    """
+    Calories and macros of a recipe scaled to a portion, all by the same
+    factor, so the macros stay consistent with the calories.
+    """
+    scaled = {"calories": int(recipe["calories"] * factor)}
+    for name in MACROS:
+        scaled[name] = format_grams(round(parse_grams(recipe[name]) * factor))
+    return scaled
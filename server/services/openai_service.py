@@ -1,7 +1,18 @@
+import json
+import os
 import random
+import secrets
+import zlib
+from collections import defaultdict
 
-# Expanded meal database with ingredients and nutrition
-MEAL_DATABASE = {
+import persistence
+from services.catalog import CatalogArchive, CatalogHandle, RecipeCatalog, parse_grams
+from services.nutrition import apply_to_catalog, scale_nutrition
+
+# Built-in recipes with the nutrition figures they were first typed in
+# with. Plans generated before nutrition was computed from ingredients
+# used these, so seed-mode plans from then can still be rebuilt.
+STATED_MEAL_DATABASE = {
     "breakfasts": [
         {
             "name": "Oatmeal with Fruits",
@@ -318,10 +329,97 @@ MEAL_DATABASE = {
     ]
 }
 
-def generate_meal_plan(days=7, preferences="", servings=1, target_calories=2000):
+# The built-in catalog, with calories and macros computed from each
+# recipe's ingredients; recipes whose figures changed a lot are listed in
+# BUILTIN_NUTRITION_NOTES (and by `python -m services.catalog build`)
+BUILTIN_MEAL_DATABASE, BUILTIN_NUTRITION_NOTES = apply_to_catalog(STATED_MEAL_DATABASE)
+BUILTIN_CATALOGS = (BUILTIN_MEAL_DATABASE, STATED_MEAL_DATABASE)
+
+# Optional memory-mapped catalog file (see services/catalog.py); it is
+# reloaded automatically when the file changes. With DATA_DIR set, every
+# version is copied under it so seed-mode plans can always be rebuilt.
+RECIPE_CATALOG_PATH = os.getenv('RECIPE_CATALOG_PATH')
+MEAL_DATABASE = (
+    CatalogHandle(
+        RECIPE_CATALOG_PATH,
+        archive=CatalogArchive(os.path.join(persistence.DATA_DIR, 'catalogs')) if persistence.DATA_DIR else None
+    ) if RECIPE_CATALOG_PATH else BUILTIN_MEAL_DATABASE
+)
+
+# Bumped whenever generate_meal_plan output changes for the same seed and
+# catalog, so seed-mode plans are rebuilt the way they were generated.
+# 1: only calories were scaled to the target; 2: macros scale with them
+GENERATOR_VERSION = 2
+
+# id of a built-in catalog -> its version
+_builtin_versions = {}
+
+
+def current_catalog():
+    """
+    The recipe catalog as loaded right now. Hold on to it for the length
+    of one operation so a reload cannot mix recipes from two catalogs.
+    """
+    if isinstance(MEAL_DATABASE, CatalogHandle):
+        return MEAL_DATABASE.current
+    return MEAL_DATABASE
+
+
+def catalog_version(catalog=None):
+    """Short fingerprint of a recipe catalog (default: the loaded one), stored with each plan."""
+    if catalog is None:
+        catalog = MEAL_DATABASE
+    if isinstance(catalog, (CatalogHandle, RecipeCatalog)):
+        return catalog.version
+    version = _builtin_versions.get(id(catalog))
+    if version is None:
+        encoded = json.dumps(catalog, sort_keys=True).encode("utf-8")
+        version = format(zlib.crc32(encoded), "08x")
+        if any(catalog is builtin for builtin in BUILTIN_CATALOGS):
+            _builtin_versions[id(catalog)] = version
+    return version
+
+
+def catalog_is_durable(version):
+    """Whether a catalog version stays available across catalog changes and restarts."""
+    if isinstance(MEAL_DATABASE, CatalogHandle) and MEAL_DATABASE.is_durable(version):
+        return True
+    return any(version == catalog_version(catalog) for catalog in BUILTIN_CATALOGS)
+
+
+def catalog_for_version(version):
+    """The catalog a plan was generated from, or None if it is no longer available."""
+    if isinstance(MEAL_DATABASE, CatalogHandle):
+        catalog = MEAL_DATABASE.pinned(version)
+        if catalog is not None:
+            return catalog
+    for catalog in BUILTIN_CATALOGS:
+        if version == catalog_version(catalog):
+            return catalog
+    return None
+
+
+def generate_meal_plan(days=7, preferences="", servings=1, target_calories=2000, seed=None,
+                       variety=False, recent_recipes=None, generator=GENERATOR_VERSION,
+                       catalog=None):
     """
     Generate a detailed meal plan with ingredients and nutrition facts.
+    Each call uses its own RNG, so the same seed, parameters, catalog
+    version and generator version always produce the same plan. Recipes
+    come from `catalog`, or from the catalog loaded when the call starts.
+
+    With variety=True recipes are not repeated within the plan until their
+    category runs out, and recipes in recent_recipes (name -> decayed count)
+    are drawn less often. Such plans depend on the user's history, so they
+    are not reproducible from the seed alone.
     """
+    if seed is None:
+        seed = secrets.randbits(63)
+    if catalog is None:
+        catalog = current_catalog()
+    rng = random.Random(seed)
+    pick = VarietyPicker(rng, recent_recipes, catalog) if variety else None
+
     plan = {
         "title": f"{days}-Day {preferences + ' ' if preferences else ''}Meal Plan",
         "days": [],
@@ -329,85 +427,190 @@ def generate_meal_plan(days=7, preferences="", servings=1, target_calories=2000)
             "total_days": days,
             "avg_daily_calories": target_calories,
             "dietary_notes": preferences if preferences else "Balanced nutrition plan"
-        }
+        },
+        "seed": seed,
+        "catalog_version": catalog_version(catalog)
     }
+    if generator > 1:
+        plan["generator"] = generator
+    if variety:
+        plan["variety"] = True
 
     for day in range(1, days + 1):
-        # Select random meals from each category
-        breakfast = random.choice(MEAL_DATABASE["breakfasts"])
-        lunch = random.choice(MEAL_DATABASE["lunches"])
-        dinner = random.choice(MEAL_DATABASE["dinners"])
-        
-        # Adjust calories based on target
-        breakfast_calories = adjust_calories(breakfast["calories"], target_calories, 0.25)
-        lunch_calories = adjust_calories(lunch["calories"], target_calories, 0.35)
-        dinner_calories = adjust_calories(dinner["calories"], target_calories, 0.35)
-        
-        day_plan = {
-            "day": day,
-            "date": f"Day {day}",
-            "meals": [
-                {
-                    "type": "Breakfast",
-                    "name": breakfast["name"],
-                    "ingredients": breakfast["ingredients"],
-                    "calories": breakfast_calories,
-                    "protein": breakfast["protein"],
-                    "carbs": breakfast["carbs"],
-                    "fat": breakfast["fat"],
-                    "instructions": breakfast["instructions"]
-                },
-                {
-                    "type": "Lunch",
-                    "name": lunch["name"],
-                    "ingredients": lunch["ingredients"],
-                    "calories": lunch_calories,
-                    "protein": lunch["protein"],
-                    "carbs": lunch["carbs"],
-                    "fat": lunch["fat"],
-                    "instructions": lunch["instructions"]
-                },
-                {
-                    "type": "Dinner",
-                    "name": dinner["name"],
-                    "ingredients": dinner["ingredients"],
-                    "calories": dinner_calories,
-                    "protein": dinner["protein"],
-                    "carbs": dinner["carbs"],
-                    "fat": dinner["fat"],
-                    "instructions": dinner["instructions"]
-                }
-            ],
-            "total_calories": breakfast_calories + lunch_calories + dinner_calories
+        plan["days"].append(build_day(day, rng, target_calories, pick, generator, catalog))
+
+    return plan
+
+# Meal type -> (catalog category, share of daily calories)
+MEAL_SLOTS = {
+    "Breakfast": ("breakfasts", 0.25),
+    "Lunch": ("lunches", 0.35),
+    "Dinner": ("dinners", 0.35),
+    "Snack": ("snacks", 0.05)
+}
+
+MACROS = ("protein", "carbs", "fat")
+TOTAL_KEYS = ("total_calories",) + tuple(f"total_{macro}" for macro in MACROS)
+
+def build_meal(meal_type, recipe, target_calories, generator=GENERATOR_VERSION):
+    """
+    Build a plan meal from a catalog recipe, scaled to the daily target.
+    """
+    _, ratio = MEAL_SLOTS[meal_type]
+    if generator < 2:
+        return {
+            "type": meal_type,
+            "name": recipe["name"],
+            "ingredients": recipe["ingredients"],
+            "calories": adjust_calories(recipe["calories"], target_calories, ratio),
+            "protein": recipe["protein"],
+            "carbs": recipe["carbs"],
+            "fat": recipe["fat"],
+            "instructions": recipe["instructions"]
         }
+    return {
+        "type": meal_type,
+        "name": recipe["name"],
+        "ingredients": recipe["ingredients"],
+        # Macros scale with the portion so they stay consistent with calories
+        **scale_nutrition(recipe, portion_factor(recipe["calories"], target_calories, ratio)),
+        "instructions": recipe["instructions"]
+    }
 
-        # 60% chance to include a snack
-        if random.random() > 0.4:
-            snack = random.choice(MEAL_DATABASE["snacks"])
-            snack_calories = adjust_calories(snack["calories"], target_calories, 0.05)
-            day_plan["meals"].append({
-                "type": "Snack",
-                "name": snack["name"],
-                "ingredients": snack["ingredients"],
-                "calories": snack_calories,
-                "protein": snack["protein"],
-                "carbs": snack["carbs"],
-                "fat": snack["fat"],
-                "instructions": snack["instructions"]
-            })
-            day_plan["total_calories"] += snack_calories
-
-        plan["days"].append(day_plan)
+class VarietyPicker:
+    """
+    Picks recipes without replacement within a plan and downweights
+    recently eaten ones. Uses rejection sampling, so large catalogs are
+    only scanned when sampling keeps landing on used recipes.
+    """
 
-    return plan
+    MAX_ATTEMPTS = 32
+
+    def __init__(self, rng, recent_recipes=None, catalog=None):
+        self.rng = rng
+        self.recent = recent_recipes or {}
+        self.catalog = current_catalog() if catalog is None else catalog
+        self.used = defaultdict(set)
+
+    def __call__(self, meal_type):
+        recipes = self.catalog[MEAL_SLOTS[meal_type][0]]
+        used = self.used[meal_type]
+        if len(used) >= len(recipes):
+            # Every recipe has been used once; start another round
+            used.clear()
+
+        recipe = None
+        for _ in range(self.MAX_ATTEMPTS):
+            candidate = self.rng.choice(recipes)
+            if candidate["name"] in used:
+                continue
+            recipe = candidate
+            if self.rng.random() < 1.0 / (1.0 + self.recent.get(candidate["name"], 0.0)):
+                break
+        if recipe is None:
+            # Nearly every recipe is used: pick from the ones that are not
+            unused = [candidate for candidate in recipes if candidate["name"] not in used]
+            recipe = self.rng.choice(unused) if unused else candidate
+
+        used.add(recipe["name"])
+        return recipe
+
+def build_day(day, rng, target_calories, pick=None, generator=GENERATOR_VERSION, catalog=None):
+    """
+    Build one day of meals using the given random.Random, or the given
+    pick(meal_type) function when one is supplied.
+    """
+    if pick is None:
+        if catalog is None:
+            catalog = current_catalog()
+
+        def pick(meal_type):
+            return rng.choice(catalog[MEAL_SLOTS[meal_type][0]])
+
+    meals = [
+        build_meal(meal_type, pick(meal_type), target_calories, generator)
+        for meal_type in ("Breakfast", "Lunch", "Dinner")
+    ]
+
+    # 60% chance to include a snack
+    if rng.random() > 0.4:
+        meals.append(build_meal("Snack", pick("Snack"), target_calories, generator))
+
+    day_plan = {
+        "day": day,
+        "date": f"Day {day}",
+        "meals": meals
+    }
+    day_plan.update(day_totals(meals))
+    return day_plan
+
+def day_totals(meals):
+    """
+    Total calories and macros (in grams) for a list of meals.
+    """
+    totals = {"total_calories": sum(meal["calories"] for meal in meals)}
+    for macro in MACROS:
+        totals[f"total_{macro}"] = sum(parse_grams(meal[macro]) for meal in meals)
+    return totals
+
+def replace_meal(day_plan, meal_index, new_meal):
+    """
+    Return a copy of day_plan with one meal replaced. Totals are updated
+    incrementally from the old and new meal instead of re-summing the day.
+    """
+    meals = list(day_plan["meals"])
+    old_meal = meals[meal_index]
+    meals[meal_index] = new_meal
+
+    updated = dict(day_plan, meals=meals)
+    if any(key not in day_plan for key in TOTAL_KEYS):
+        # Plans generated before macro totals existed, or edited without them
+        updated.update(day_totals(meals))
+        return updated
+
+    updated["total_calories"] = day_plan["total_calories"] - old_meal["calories"] + new_meal["calories"]
+    for macro in MACROS:
+        key = f"total_{macro}"
+        updated[key] = day_plan[key] - parse_grams(old_meal[macro]) + parse_grams(new_meal[macro])
+    return updated
+
+def find_recipe(meal_type, name):
+    """
+    Look up a catalog recipe by name for a meal type.
+    """
+    category = MEAL_SLOTS[meal_type][0]
+    if isinstance(MEAL_DATABASE, CatalogHandle):
+        return MEAL_DATABASE.find_recipe(category, name)
+    for recipe in MEAL_DATABASE[category]:
+        if recipe["name"] == name:
+            return recipe
+    return None
+
+def pick_recipe(meal_type, rng, exclude=None):
+    """
+    Pick a random recipe for a meal type, avoiding `exclude` when possible.
+    """
+    recipes = MEAL_DATABASE[MEAL_SLOTS[meal_type][0]]
+    recipe = rng.choice(recipes)
+    # Redraw instead of filtering so large catalogs are not scanned
+    for _ in range(8):
+        if recipe["name"] != exclude:
+            break
+        recipe = rng.choice(recipes)
+    return recipe
 
 def adjust_calories(base_calories, target_calories, meal_ratio):
     """
     Adjust meal calories to match target daily calories.
     """
+    return int(base_calories * portion_factor(base_calories, target_calories, meal_ratio))
+
+def portion_factor(base_calories, target_calories, meal_ratio):
+    """
+    Factor scaling a recipe to its share of the target daily calories.
+    """
     target_meal_calories = target_calories * meal_ratio
-    adjustment_factor = target_meal_calories / base_calories if base_calories > 0 else 1
-    return int(base_calories * adjustment_factor)
+    return target_meal_calories / base_calories if base_calories > 0 else 1
 
 # Example usage
 if __name__ == "__main__":
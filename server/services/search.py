@@ -0,0 +1,188 @@
+"""
+Full-text search over the recipe catalog and each user's meal plans.
+
+The recipe index is an inverted index from normalized terms to recipes,
+weighted by TF-IDF over names, ingredients and instructions. It is built
+once per catalog version. Each user also has a posting list from recipe
+name to the plans that contain it, maintained as plans are created,
+edited and deleted, so searching never scans stored plans.
+"""
+
+import heapq
+import math
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from services import openai_service
+
+# Relative weight of a term match in each recipe field
+FIELD_WEIGHTS = {"name": 3.0, "ingredients": 2.0, "instructions": 1.0}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words with simple plural stripping ("lentils" -> "lentil")."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def plan_recipe_names(plan_content) -> List[str]:
+    """Sorted names of the recipes used in a plan."""
+    if not isinstance(plan_content, dict):
+        return []
+    names = {
+        meal.get("name")
+        for day in plan_content.get("days", [])
+        for meal in day.get("meals", [])
+        if meal.get("name")
+    }
+    return sorted(names)
+
+
+class RecipeIndex:
+    """Inverted index over one version of the recipe catalog."""
+
+    def __init__(self, catalog, version: str):
+        self.version = version
+        # term -> {recipe name: weight}
+        self.postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        # recipe name -> category
+        self.categories: Dict[str, str] = {}
+
+        term_counts = {}
+        for category, recipes in catalog.items():
+            for recipe in recipes:
+                name = recipe["name"]
+                self.categories[name] = category
+                counts = defaultdict(float)
+                for field, weight in FIELD_WEIGHTS.items():
+                    value = recipe.get(field, "")
+                    if isinstance(value, list):
+                        value = " ".join(value)
+                    for token in tokenize(value):
+                        counts[token] += weight
+                term_counts[name] = counts
+
+        total = max(len(term_counts), 1)
+        document_frequency = defaultdict(int)
+        for counts in term_counts.values():
+            for token in counts:
+                document_frequency[token] += 1
+        for name, counts in term_counts.items():
+            for token, count in counts.items():
+                idf = math.log(1 + total / document_frequency[token])
+                self.postings[token][name] = (1 + math.log(count)) * idf
+        self.postings = dict(self.postings)
+
+    def search(self, query: str) -> Dict[str, float]:
+        """Score recipes for a query; recipes must match every term."""
+        tokens = set(tokenize(query))
+        if not tokens:
+            return {}
+        postings = [self.postings.get(token, {}) for token in tokens]
+        postings.sort(key=len)
+        scores = dict(postings[0])
+        for posting in postings[1:]:
+            scores = {name: score + posting[name] for name, score in scores.items() if name in posting}
+        return scores
+
+
+_recipe_index: Optional[RecipeIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_recipe_index() -> RecipeIndex:
+    """Return the recipe index, rebuilding it when the catalog changes."""
+    global _recipe_index
+    catalog = openai_service.current_catalog()
+    version = openai_service.catalog_version(catalog)
+    if _recipe_index is None or _recipe_index.version != version:
+        with _index_lock:
+            if _recipe_index is None or _recipe_index.version != version:
+                _recipe_index = RecipeIndex(catalog, version)
+    return _recipe_index
+
+
+# user ID -> recipe name -> plan IDs
+user_recipe_plans: Dict[str, Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
+# Guards user_recipe_plans; store writes are not serialized without DATA_DIR
+_plans_lock = threading.Lock()
+
+
+def index_plan(user_id: str, plan_id: str, recipe_names: Iterable[str]):
+    """Add a plan to its owner's recipe posting lists."""
+    with _plans_lock:
+        postings = user_recipe_plans[user_id]
+        for name in recipe_names:
+            postings[name].add(plan_id)
+
+
+def unindex_plan(user_id: str, plan_id: str, recipe_names: Iterable[str]):
+    """Remove a plan from its owner's recipe posting lists."""
+    with _plans_lock:
+        postings = user_recipe_plans.get(user_id)
+        if not postings:
+            return
+        for name in recipe_names:
+            plan_ids = postings.get(name)
+            if plan_ids is not None:
+                plan_ids.discard(plan_id)
+                if not plan_ids:
+                    del postings[name]
+
+
+def clear_plan_index():
+    with _plans_lock:
+        user_recipe_plans.clear()
+
+
+def _plan_postings(user_id: str, recipe_names: Iterable[str]) -> Dict[str, tuple]:
+    """Copy of the user's posting lists for some recipes."""
+    with _plans_lock:
+        postings = user_recipe_plans.get(user_id, {})
+        return {name: tuple(postings.get(name, ())) for name in recipe_names}
+
+
+def search(user_id: str, query: str, limit: int = 20) -> dict:
+    """
+    Search the catalog and the user's plans.
+    Plans are ranked by the summed scores of the matching recipes they use.
+    """
+    index = get_recipe_index()
+    recipe_scores = index.search(query)
+    # Score a copy so concurrent plan writes cannot change the sets mid-iteration
+    postings = _plan_postings(user_id, recipe_scores)
+
+    ranked_recipes = sorted(recipe_scores.items(), key=lambda item: (-item[1], item[0]))
+    recipes = []
+    plan_scores = defaultdict(float)
+    plan_matches = defaultdict(list)
+    for name, score in ranked_recipes:
+        plan_ids = postings[name]
+        for plan_id in plan_ids:
+            plan_scores[plan_id] += score
+            plan_matches[plan_id].append(name)
+        if len(recipes) < limit:
+            recipes.append({
+                "name": name,
+                "category": index.categories.get(name),
+                "score": round(score, 4),
+                # Most recent plans first
+                "plan_ids": heapq.nlargest(limit, plan_ids, key=int)
+            })
+
+    ranked_plans = heapq.nlargest(limit, plan_scores.items(), key=lambda item: (item[1], int(item[0])))
+    return {
+        "recipes": recipes,
+        "plans": [
+            {"id": plan_id, "score": round(score, 4), "matched_recipes": plan_matches[plan_id]}
+            for plan_id, score in ranked_plans
+        ]
+    }
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the server modules the way the app does, from the server directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Test client for the app, with rate limiting and load shedding disabled."""
+    import concurrency
+    import routes.mealplans
+    from app import app
+
+    monkeypatch.setattr(routes.mealplans, 'RATE_LIMIT_SECONDS', 0)
+    monkeypatch.setattr(concurrency, 'controller', concurrency.ConcurrencyController(capacity=1000))
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Authorization header for the seeded test user."""
+    response = client.post('/api/auth/login', json={
+        'email': 'test@example.com', 'password': 'password123'
+    })
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
@@ -0,0 +1,65 @@
+import pytest
+
+import routes.admin
+from services import analytics
+
+
+@pytest.fixture
+def clean_analytics():
+    analytics.clear()
+    yield
+    analytics.clear()
+
+
+def record(plan_id, recipes, target_calories=2000, days=3, created_at='2026-01-02T10:00:00'):
+    return {'id': plan_id, 'recipes': recipes, 'target_calories': target_calories,
+            'days': days, 'created_at': created_at}
+
+
+def test_rollups_follow_added_and_removed_plans(clean_analytics):
+    first = record('1', ['Oatmeal', 'Salad'], target_calories=1999)
+    second = record('2', ['Oatmeal'], target_calories=2000, days=7, created_at='2026-01-03T08:00:00')
+    analytics.add_plan(first)
+    analytics.add_plan(second)
+
+    rollups = analytics.rollups()
+    assert rollups['total_plans'] == 2
+    assert rollups['distinct_recipes'] == 2
+    assert rollups['top_recipes_by_plans'] == [
+        {'name': 'Oatmeal', 'plans': 2}, {'name': 'Salad', 'plans': 1}
+    ]
+    assert rollups['target_calories'] == [
+        {'min': 1750, 'max': 1999, 'plans': 1}, {'min': 2000, 'max': 2249, 'plans': 1}
+    ]
+    assert rollups['days'] == [{'days': 3, 'plans': 1}, {'days': 7, 'plans': 1}]
+    assert rollups['plans_per_day'] == {'2026-01-02': 1, '2026-01-03': 1}
+
+    analytics.remove_plan(first)
+    rollups = analytics.rollups(top_recipes=1)
+    assert rollups['total_plans'] == 1
+    assert rollups['distinct_recipes'] == 1
+    assert rollups['top_recipes_by_plans'] == [{'name': 'Oatmeal', 'plans': 1}]
+    assert rollups['plans_per_day'] == {'2026-01-03': 1}
+
+
+def test_admin_analytics(client, auth_headers, monkeypatch):
+    assert client.get('/api/admin/analytics', headers=auth_headers).status_code == 403
+    monkeypatch.setattr(routes.admin, 'ADMIN_EMAILS', {'test@example.com'})
+
+    before = client.get('/api/admin/analytics', headers=auth_headers).get_json()
+    response = client.post('/api/mealplans/generate', json={'days': 2}, headers=auth_headers)
+    plan = response.get_json()['meal_plan']
+    response = client.get('/api/admin/analytics?top=1000', headers=auth_headers)
+    assert response.status_code == 200
+    after = response.get_json()
+
+    assert after['total_plans'] == before['total_plans'] + 1
+    assert after['system_stats']['total_meal_plans'] == after['total_plans']
+    plans = {entry['name']: entry['plans'] for entry in after['top_recipes_by_plans']}
+    previous = {entry['name']: entry['plans'] for entry in before['top_recipes_by_plans']}
+    # Each recipe counts once for the new plan, however many meals use it
+    for name in plan['recipes']:
+        assert plans[name] == previous.get(name, 0) + 1
+
+    response = client.get('/api/admin/analytics?top=0', headers=auth_headers)
+    assert response.status_code == 400
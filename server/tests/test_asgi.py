@@ -0,0 +1,161 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import asgi
+import concurrency
+import routes.mealplans
+from routes.auth import create_token
+from services import async_backends
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(routes.mealplans, 'RATE_LIMIT_SECONDS', 0)
+
+
+async def call(method, path, body=None, headers=()):
+    """Send one request through the ASGI app; returns (status, headers, body)."""
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': b'',
+        'root_path': '', 'http_version': '1.1', 'server': ('testserver', 80),
+        'headers': [(b'authorization', f"Bearer {create_token('1')}".encode()), *headers]
+    }
+    messages = [{'type': 'http.request', 'body': json.dumps(body).encode() if body else b''}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi.app(scope, receive, send)
+    return sent[0]['status'], dict(sent[0]['headers']), sent[1]['body']
+
+
+@pytest.fixture
+def slow_model(monkeypatch):
+    """Make generation wait on the event loop like a remote model call."""
+    generate = asgi.model_client.generate
+
+    async def slow_generate(*args, **kwargs):
+        await asyncio.sleep(0.05)
+        return await generate(*args, **kwargs)
+
+    monkeypatch.setattr(asgi.model_client, 'generate', slow_generate)
+
+
+def test_asgi_admits_many_concurrent_generations(monkeypatch, slow_model):
+    monkeypatch.setattr(concurrency, 'asgi_controller', concurrency.ConcurrencyController(
+        concurrency.ASGI_CONCURRENCY_CAPACITY
+    ))
+
+    async def main():
+        return await asyncio.gather(*[
+            call('POST', '/api/mealplans/generate', {'days': 1}) for _ in range(16)
+        ])
+
+    statuses = [status for status, _, _ in asyncio.run(main())]
+    assert statuses == [201] * 16
+
+
+def test_asgi_replays_carry_replayed_header(slow_model):
+    import idempotency
+
+    key_header = (b'idempotency-key', b'asgi-replay-test')
+    replayed = idempotency.REPLAYED_HEADER.lower().encode()
+
+    async def main():
+        # Two requests with one key at once: the second joins the first
+        joined = await asyncio.gather(*[
+            call('POST', '/api/mealplans/generate', {'days': 1}, [key_header]) for _ in range(2)
+        ])
+        stored = await call('POST', '/api/mealplans/generate', {'days': 1}, [key_header])
+        return joined, stored
+
+    joined, stored = asyncio.run(main())
+    assert [status for status, _, _ in joined] == [201, 201]
+    assert [replayed in headers for _, headers, _ in joined] == [False, True]
+    assert stored[0] == 201 and stored[1][replayed] == b'true'
+    assert stored[2] == joined[0][2]
+
+
+def test_asgi_generation_does_not_block_the_event_loop(monkeypatch):
+    generate_meal_plan = async_backends.generate_meal_plan
+
+    def slow_generate_meal_plan(*args, **kwargs):
+        time.sleep(0.2)
+        return generate_meal_plan(*args, **kwargs)
+
+    monkeypatch.setattr(async_backends, 'generate_meal_plan', slow_generate_meal_plan)
+
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(*[asgi.model_client.generate(1, '', 1, 2000) for _ in range(4)])
+        return time.perf_counter() - start
+
+    assert asyncio.run(main()) < 0.6
+
+
+def test_asgi_forwards_auth_routes_to_flask():
+    credentials = {'email': 'test@example.com', 'password': 'password123'}
+    length = str(len(json.dumps(credentials))).encode()
+    status, _, body = asyncio.run(call('POST', '/api/auth/login', credentials, headers=[
+        (b'content-type', b'application/json'), (b'content-length', length)
+    ]))
+    assert status == 200
+    assert 'token' in json.loads(body)
+
+
+def test_asgi_regenerate_does_not_block_the_event_loop(monkeypatch):
+    regenerate_part = asgi.regenerate_part
+
+    def slow_regenerate_part(*args, **kwargs):
+        # Stands in for waiting on the plan's lock and the log fsync
+        time.sleep(0.2)
+        return regenerate_part(*args, **kwargs)
+
+    monkeypatch.setattr(asgi, 'regenerate_part', slow_regenerate_part)
+
+    async def main():
+        status, _, body = await call('POST', '/api/mealplans/generate', {'days': 1})
+        assert status == 201
+        plan_id = json.loads(body)['meal_plan']['id']
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            call('POST', f'/api/mealplans/{plan_id}/regenerate', {'day': 1}) for _ in range(4)
+        ])
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(main())
+    assert [status for status, _, _ in results] == [200] * 4
+    assert elapsed < 0.6
+
+
+def lifespan_startup():
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app({'type': 'lifespan'}, receive, send))
+    return sent[0]
+
+
+def test_asgi_startup_refuses_multiple_workers_on_in_memory_store(monkeypatch):
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    message = lifespan_startup()
+    assert message['type'] == 'lifespan.startup.failed'
+    assert 'in-memory store' in message['message']
+
+
+def test_asgi_startup_allows_one_worker(monkeypatch):
+    monkeypatch.delenv('WEB_CONCURRENCY', raising=False)
+    assert lifespan_startup()['type'] == 'lifespan.startup.complete'
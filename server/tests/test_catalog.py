@@ -0,0 +1,135 @@
+import copy
+import os
+
+import pytest
+
+import plan_storage
+from services import openai_service
+from services.catalog import CatalogArchive, CatalogHandle, build_catalog
+from services.openai_service import BUILTIN_MEAL_DATABASE, generate_meal_plan
+
+
+def renamed_catalog(prefix):
+    recipes = copy.deepcopy(BUILTIN_MEAL_DATABASE)
+    for items in recipes.values():
+        for recipe in items:
+            recipe["name"] = prefix + recipe["name"]
+    return recipes
+
+
+@pytest.fixture
+def catalog_file(tmp_path, monkeypatch):
+    """
+    A catalog file loaded through a handle that rechecks it on every
+    access and copies each version to an archive directory.
+    """
+    path = str(tmp_path / "catalog.bin")
+    build_catalog(renamed_catalog("Old "), path)
+    archive = CatalogArchive(str(tmp_path / "archive"))
+    monkeypatch.setattr(openai_service, "MEAL_DATABASE", CatalogHandle(path, reload_interval=0, archive=archive))
+
+    def replace(prefix):
+        build_catalog(renamed_catalog(prefix), path)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    replace.path = path
+    replace.archive = archive
+    return replace
+
+
+def meal_names(plan):
+    return [meal["name"] for day in plan["days"] for meal in day["meals"]]
+
+
+def seed_record(plan):
+    return {"days": len(plan["days"]), "preferences": "", "servings": 1, "target_calories": 2000,
+            "seed": plan["seed"], "catalog_version": plan["catalog_version"],
+            "generator": plan.get("generator", 1)}
+
+
+def test_seed_plans_rebuild_from_their_catalog_after_reload(catalog_file):
+    plan = generate_meal_plan(days=3, seed=3301)
+    catalog_file("New ")
+    assert openai_service.catalog_version() != plan["catalog_version"]
+
+    assert plan_storage.rebuild_content(seed_record(plan)) == plan
+
+
+def test_seed_plans_rebuild_from_the_archive_after_restart(catalog_file, monkeypatch):
+    plan = generate_meal_plan(days=3, seed=3304)
+    catalog_file("New ")
+    restarted = CatalogHandle(catalog_file.path, reload_interval=0, archive=catalog_file.archive)
+    monkeypatch.setattr(openai_service, "MEAL_DATABASE", restarted)
+
+    assert restarted.version != plan["catalog_version"]
+    assert plan_storage.rebuild_content(seed_record(plan)) == plan
+
+
+def test_seed_plans_without_their_catalog_raise(catalog_file):
+    plan = generate_meal_plan(days=2, seed=3302)
+    record = {**seed_record(plan), "catalog_version": "00000000"}
+
+    with pytest.raises(plan_storage.PlanUnavailable):
+        plan_storage.rebuild_content(record)
+
+
+def test_only_plans_from_durable_catalogs_stay_in_seed_form(catalog_file, monkeypatch):
+    monkeypatch.setattr(plan_storage, "PLAN_STORAGE", "seed")
+    plan = {"id": "1", **seed_record(generate_meal_plan(days=1, seed=3305))}
+    plan["plan_content"] = generate_meal_plan(days=1, seed=3305)
+    assert plan_storage.BLOB_KEY not in plan_storage.to_record(plan, reproducible=True)
+
+    # Without an archive the version would be lost with the catalog file
+    monkeypatch.setattr(openai_service, "MEAL_DATABASE", CatalogHandle(catalog_file.path))
+    assert plan_storage.BLOB_KEY in plan_storage.to_record(plan, reproducible=True)
+
+
+def test_old_catalog_mappings_are_capped(tmp_path):
+    path = str(tmp_path / "catalog.bin")
+    build_catalog(renamed_catalog("V0 "), path)
+    handle = CatalogHandle(path, reload_interval=0, max_pinned=2)
+    for i in range(1, 5):
+        build_catalog(renamed_catalog(f"V{i} "), path)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + i * 1_000_000))
+        handle.current
+    assert len(handle._pinned) == 2
+
+
+def test_unavailable_seed_plan_is_an_explicit_error(catalog_file, client, auth_headers, monkeypatch):
+    monkeypatch.setattr(plan_storage, "PLAN_STORAGE", "seed")
+    response = client.post('/api/mealplans/generate', json={'days': 1}, headers=auth_headers)
+    plan_id = response.get_json()['meal_plan']['id']
+
+    # The catalog file changes and its archived copy is lost
+    catalog_file("New ")
+    monkeypatch.setattr(openai_service, "MEAL_DATABASE", CatalogHandle(catalog_file.path))
+    plan_storage._rebuild.cache_clear()
+    try:
+        response = client.get(f'/api/mealplans/{plan_id}', headers=auth_headers)
+        assert response.status_code == 500
+        assert 'no longer available' in response.get_json()['error']
+
+        plans = client.get('/api/mealplans/', headers=auth_headers).get_json()['meal_plans']
+        listed = next(plan for plan in plans if plan['id'] == plan_id)
+        assert 'plan_content' not in listed
+    finally:
+        client.delete(f'/api/mealplans/{plan_id}', headers=auth_headers)
+
+
+def test_generation_uses_one_catalog_across_a_reload(catalog_file, monkeypatch):
+    build_meal = openai_service.build_meal
+    calls = []
+
+    def build_meal_then_reload(*args, **kwargs):
+        calls.append(None)
+        if len(calls) == 1:
+            catalog_file("New ")
+        return build_meal(*args, **kwargs)
+
+    monkeypatch.setattr(openai_service, "build_meal", build_meal_then_reload)
+    plan = generate_meal_plan(days=3, seed=3303)
+
+    assert all(name.startswith("Old ") for name in meal_names(plan))
+    assert openai_service.catalog_version() != plan["catalog_version"]
@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+import cold_store
+import persistence
+from models import MealPlan, cold_plans, meal_plans_db
+from services.openai_service import generate_meal_plan
+
+
+@pytest.fixture
+def cold_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cold_store, 'COLD_STORE_DIR', str(tmp_path))
+    plan_ids = []
+    yield plan_ids
+    for plan_id in plan_ids:
+        MealPlan.delete(plan_id)
+
+
+def _create(plan_ids, user_id='cold-test'):
+    plan = MealPlan.create(user_id, {
+        'days': 1, 'preferences': '', 'servings': 1, 'target_calories': 2000,
+        'plan_content': generate_meal_plan(days=1)
+    })
+    plan_ids.append(plan['id'])
+    return plan
+
+
+def test_plan_list_leaves_cold_plans_cold(cold_dir):
+    hot = _create(cold_dir)
+    cold = _create(cold_dir)
+    assert MealPlan.freeze(cold['id'])
+
+    plans = {plan['id']: plan for plan in MealPlan.find_by_user('cold-test')}
+    assert 'plan_content' in plans[hot['id']]
+    assert 'plan_content' not in plans[cold['id']]
+    assert plans[cold['id']]['days'] == 1
+    assert cold['id'] in cold_plans
+
+    # Opening the plan brings it back
+    assert MealPlan.find_by_id(cold['id'])['plan_content'] == cold['plan_content']
+    assert cold['id'] in meal_plans_db
+
+
+def test_freeze_skips_plans_read_since_the_sweep_started(cold_dir):
+    plan = _create(cold_dir)
+    cutoff = time.time() - 60
+    cold_store.last_access[plan['id']] = time.time()
+    assert not MealPlan.freeze(plan['id'], idle_since=cutoff)
+    assert plan['id'] in meal_plans_db
+
+    cold_store.last_access[plan['id']] = cutoff - 1
+    assert MealPlan.freeze(plan['id'], idle_since=cutoff)
+    assert plan['id'] in cold_plans
+
+
+def test_freeze_waits_for_an_edit_in_progress(cold_dir):
+    plan = _create(cold_dir)
+    done = threading.Event()
+    freezer = threading.Thread(target=lambda: (MealPlan.freeze(plan['id']), done.set()))
+    with MealPlan.lock(plan['id']):
+        freezer.start()
+        assert not done.wait(0.2)
+        MealPlan.update(plan['id'], {'preferences': 'edited'})
+    freezer.join()
+    assert MealPlan.find_by_id(plan['id'])['preferences'] == 'edited'
+
+
+def test_cold_store_requires_data_dir(monkeypatch):
+    monkeypatch.setattr(cold_store, 'COLD_STORE_DIR', '/tmp/cold')
+    monkeypatch.setattr(persistence, 'DATA_DIR', None)
+    with pytest.raises(RuntimeError):
+        cold_store.check_config()
+
+
+@pytest.mark.parametrize('method, path', [
+    ('get', '/api/mealplans/{}'),
+    ('put', '/api/mealplans/{}'),
+    ('post', '/api/mealplans/{}/regenerate'),
+    ('delete', '/api/mealplans/{}'),
+])
+def test_other_users_cannot_thaw_cold_plans(client, auth_headers, cold_dir, method, path):
+    plan = _create(cold_dir, user_id='someone-else')
+    assert MealPlan.freeze(plan['id'])
+
+    response = getattr(client, method)(path.format(plan['id']), json={'day': 1}, headers=auth_headers)
+    assert response.status_code == 403
+    assert plan['id'] in cold_plans
@@ -0,0 +1,54 @@
+import threading
+
+import models
+import routes.dashboard
+
+
+def test_bootstrap_etag_changes_with_store_instance(client, auth_headers, monkeypatch):
+    response = client.get('/api/dashboard/bootstrap', headers=auth_headers)
+    etag = response.headers['ETag']
+    cached = client.get('/api/dashboard/bootstrap', headers={**auth_headers, 'If-None-Match': etag})
+    assert cached.status_code == 304
+
+    # A restarted in-memory store counts versions from zero again
+    monkeypatch.setattr(routes.dashboard, 'STORE_INSTANCE', 'restarted')
+    response = client.get('/api/dashboard/bootstrap', headers={**auth_headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_concurrent_version_bumps_are_not_lost():
+    user_id = 'version-test'
+    threads = [
+        threading.Thread(target=lambda: [models._bump_version(user_id) for _ in range(5000)])
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    try:
+        assert models.MealPlan.user_version(user_id) == 40000
+    finally:
+        models.user_plan_versions.pop(user_id, None)
+
+
+def test_bootstrap_etag_changes_when_a_plan_goes_cold(client, auth_headers, tmp_path, monkeypatch):
+    import cold_store
+    from services.openai_service import generate_meal_plan
+
+    monkeypatch.setattr(cold_store, 'COLD_STORE_DIR', str(tmp_path))
+    # Another user's plan: neither this user's version nor the plan total changes
+    plan = models.MealPlan.create('etag-cold-test', {
+        'days': 1, 'preferences': '', 'servings': 1, 'target_calories': 2000,
+        'plan_content': generate_meal_plan(days=1)
+    })
+    try:
+        etag = client.get('/api/dashboard/bootstrap', headers=auth_headers).headers['ETag']
+        assert models.MealPlan.freeze(plan['id'])
+        response = client.get('/api/dashboard/bootstrap',
+                              headers={**auth_headers, 'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.get_json()['system_stats']['cold_meal_plans'] >= 1
+    finally:
+        models.MealPlan.delete(plan['id'])
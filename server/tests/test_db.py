@@ -0,0 +1,20 @@
+import pytest
+
+import db
+
+
+def test_unknown_storage_backend_is_refused(monkeypatch):
+    from app import create_app
+
+    monkeypatch.setattr(db, 'STORAGE_BACKEND', 'postgres')
+    with pytest.raises(RuntimeError, match='postgres'):
+        db.check_config()
+    with pytest.raises(RuntimeError):
+        create_app()
+
+
+def test_in_memory_store_refuses_multiple_workers():
+    db.check_config()
+    db.check_worker_config(1)
+    with pytest.raises(RuntimeError):
+        db.check_worker_config(2)
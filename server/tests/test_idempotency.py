@@ -0,0 +1,68 @@
+import pytest
+
+import idempotency
+
+
+def test_replays_completed_response():
+    store = idempotency.IdempotencyStore()
+    future, owner = store.begin('1', 'key', 'fp')
+    assert owner
+    store.finish('1', 'key', 201, '1')
+
+    replay, owner = store.begin('1', 'key', 'fp')
+    assert not owner
+    assert replay.result() == (201, '1')
+
+    with pytest.raises(idempotency.IdempotencyConflict):
+        store.begin('1', 'key', 'other')
+
+
+def test_failures_are_not_kept():
+    store = idempotency.IdempotencyStore()
+    store.begin('1', 'key', 'fp')
+    store.finish('1', 'key', 500, '1')
+    _, owner = store.begin('1', 'key', 'fp')
+    assert owner
+
+
+def test_max_keys_enforced_while_oldest_key_is_in_flight():
+    store = idempotency.IdempotencyStore(max_keys=3)
+    store.begin('1', 'pending', 'fp')
+    for n in range(10):
+        store.begin('1', str(n), 'fp')
+        store.finish('1', str(n), 201, '1')
+
+    keys = [key for _, key in store._entries]
+    assert len(keys) <= 4
+    assert 'pending' in keys
+    assert '9' in keys
+    # The in-flight request can still publish its result
+    store.finish('1', 'pending', 201, '1')
+
+
+def _generate(client, headers, key):
+    return client.post('/api/mealplans/generate', json={'days': 1},
+                       headers={**headers, idempotency.HEADER: key})
+
+
+def test_replays_keep_plan_id_not_response(client, auth_headers):
+    first = _generate(client, auth_headers, 'keep-id')
+    assert first.status_code == 201
+    plan = first.get_json()['meal_plan']
+
+    entry = idempotency.store._entries[(plan['user_id'], 'keep-id')]
+    assert entry.future.result() == (201, plan['id'])
+
+    replay = _generate(client, auth_headers, 'keep-id')
+    assert replay.status_code == 201
+    assert replay.headers[idempotency.REPLAYED_HEADER] == 'true'
+    assert replay.get_json() == first.get_json()
+
+
+def test_replay_of_deleted_plan(client, auth_headers):
+    plan = _generate(client, auth_headers, 'deleted').get_json()['meal_plan']
+    assert client.delete(f"/api/mealplans/{plan['id']}", headers=auth_headers).status_code == 200
+
+    replay = _generate(client, auth_headers, 'deleted')
+    assert replay.status_code == 410
+    assert replay.headers[idempotency.REPLAYED_HEADER] == 'true'
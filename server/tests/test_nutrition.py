@@ -0,0 +1,127 @@
+import pytest
+
+import plan_storage
+from services import nutrition
+from services.openai_service import (
+    BUILTIN_MEAL_DATABASE, BUILTIN_NUTRITION_NOTES, GENERATOR_VERSION, STATED_MEAL_DATABASE,
+    build_meal, catalog_version, generate_meal_plan
+)
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("1 cup rolled oats", (1.0, "cup", "rolled oat")),
+    ("150g chicken breast, sliced", (150.0, "g", "chicken breast")),
+    ("2 oz whole wheat pasta", (2 * 28.35, "g", "whole wheat pasta")),
+    ("1/2 cup mixed berries (strawberries, blueberries)", (0.5, "cup", "mixed berry")),
+    ("1 1/2 cups milk or water", (1.5, "cup", "milk")),
+    ("2 tbsp honey", (0.125, "cup", "honey")),
+    ("2 large eggs", (2.0, "piece", "egg")),
+    ("2 cloves garlic, minced", (2.0, "piece", "garlic")),
+    ("1 celery stalk", (1.0, "piece", "celery")),
+    ("2 lettuce leaves", (2.0, "piece", "lettuce")),
+])
+def test_parse_ingredient(line, expected):
+    quantity, unit, key = nutrition.parse_ingredient(line)
+    assert (unit, key) == expected[1:]
+    assert quantity == pytest.approx(expected[0])
+
+
+@pytest.mark.parametrize("line", [
+    "Salt and pepper to taste",
+    "Fresh cilantro for garnish",
+    "1 poached egg (optional)",
+])
+def test_uncounted_lines(line):
+    assert nutrition.parse_ingredient(line) is None
+    assert nutrition.ingredient_nutrition(line) == (0.0, 0.0, 0.0, 0.0)
+
+
+def test_unknown_ingredient_is_unresolved():
+    _, unresolved = nutrition.recipe_nutrition(["1 cup rolled oats", "3 dragon fruits"])
+    assert unresolved == ["3 dragon fruits"]
+
+
+def test_builtin_ingredients_all_resolve():
+    for recipes in BUILTIN_MEAL_DATABASE.values():
+        for recipe in recipes:
+            assert nutrition.recipe_nutrition(recipe["ingredients"])[1] == [], recipe["name"]
+
+
+def test_recipe_nutrition_is_per_serving():
+    ingredients = ["100g chicken breast", "1 tbsp olive oil"]
+    whole, _ = nutrition.recipe_nutrition(ingredients)
+    half, _ = nutrition.recipe_nutrition(ingredients, servings=2)
+    assert whole == {"calories": 284, "protein": "31g", "carbs": "0g", "fat": "17g"}
+    assert half["calories"] == 142
+    assert half["protein"] == "16g"
+
+
+def test_apply_to_catalog_uses_computed_nutrition_and_reports_differences():
+    recipe = {"name": "Chicken", "ingredients": ["100g chicken breast"], "calories": 170,
+              "protein": "1g", "carbs": "1g", "fat": "1g"}
+    batch = dict(recipe, name="Chicken for two", ingredients=["200g chicken breast"], servings=2)
+    off = dict(recipe, name="Off", calories=400)
+    unknown = dict(recipe, name="Unknown", ingredients=["3 dragon fruits"])
+    catalog, notes = nutrition.apply_to_catalog({"lunches": [recipe, batch, off, unknown]})
+    computed, batch_computed, off_computed, kept = catalog["lunches"]
+    assert computed["protein"] == "31g" and computed["calories"] == 165
+    assert batch_computed["calories"] == 165
+    assert off_computed["calories"] == 165
+    assert kept is unknown
+    assert [name for name, _ in notes] == ["Off", "Unknown"]
+
+
+def test_apply_to_catalog_tolerance_keeps_stated_nutrition():
+    off = {"name": "Off", "ingredients": ["100g chicken breast"], "calories": 400,
+           "protein": "1g", "carbs": "1g", "fat": "1g"}
+    catalog, notes = nutrition.apply_to_catalog({"lunches": [off]}, tolerance=0.2)
+    assert catalog["lunches"][0] is off
+    assert "kept its own nutrition" in notes[0][1]
+
+
+def test_builtin_nutrition_is_computed_from_ingredients():
+    for category, recipes in BUILTIN_MEAL_DATABASE.items():
+        for recipe, stated in zip(recipes, STATED_MEAL_DATABASE[category]):
+            computed, _ = nutrition.recipe_nutrition(stated["ingredients"])
+            assert {key: recipe[key] for key in computed} == computed, recipe["name"]
+    assert "Chicken Stir Fry" in dict(BUILTIN_NUTRITION_NOTES)
+
+
+def test_plans_from_stated_catalog_still_rebuild():
+    plan = generate_meal_plan(days=2, seed=4201, catalog=STATED_MEAL_DATABASE)
+    assert plan["catalog_version"] != catalog_version()
+    record = {"days": 2, "preferences": "", "servings": 1, "target_calories": 2000,
+              "seed": 4201, "catalog_version": plan["catalog_version"],
+              "generator": GENERATOR_VERSION}
+    assert plan_storage.rebuild_content(record) == plan
+
+
+def test_scale_nutrition_scales_every_macro():
+    recipe = {"calories": 400, "protein": "20g", "carbs": "50g", "fat": "10g"}
+    assert nutrition.scale_nutrition(recipe, 1.5) == {
+        "calories": 600, "protein": "30g", "carbs": "75g", "fat": "15g"
+    }
+
+
+def test_build_meal_keeps_macros_consistent_with_calories():
+    recipe = BUILTIN_MEAL_DATABASE["lunches"][0]
+    meal = build_meal("Lunch", recipe, 4000)
+    factor = meal["calories"] / recipe["calories"]
+    for macro in nutrition.MACROS:
+        expected = nutrition.parse_grams(recipe[macro]) * factor
+        assert nutrition.parse_grams(meal[macro]) == pytest.approx(expected, abs=0.5)
+
+
+def test_generator_1_plans_rebuild_unchanged():
+    plan = generate_meal_plan(days=2, target_calories=3000, seed=12345, generator=1)
+    assert "generator" not in plan
+    recipes = {recipe["name"]: recipe for items in BUILTIN_MEAL_DATABASE.values() for recipe in items}
+    for meal in plan["days"][0]["meals"]:
+        assert meal["protein"] == recipes[meal["name"]]["protein"]
+
+    record = {"days": 2, "preferences": "", "servings": 1, "target_calories": 3000,
+              "seed": 12345, "catalog_version": plan["catalog_version"]}
+    assert plan_storage.rebuild_content(record) == plan
+    current = plan_storage.rebuild_content(dict(record, generator=GENERATOR_VERSION))
+    assert current["generator"] == GENERATOR_VERSION
+    assert current["days"][0]["meals"][0]["name"] == plan["days"][0]["meals"][0]["name"]
@@ -0,0 +1,216 @@
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+import persistence
+
+
+class Store:
+    """Minimal store: a counter makes replaying a record twice visible."""
+
+    def __init__(self):
+        self.state = {'count': 0, 'items': {}}
+
+    def apply_op(self, op, payload):
+        if op == 'item.set':
+            self.state['items'][payload['key']] = payload['value']
+        self.state['count'] += 1
+
+    def dump_state(self):
+        return {'count': self.state['count'], 'items': dict(self.state['items'])}
+
+    def load_state(self, state):
+        self.state = {'count': state['count'], 'items': dict(state['items'])}
+
+    def commit(self, log, key, value):
+        payload = {'key': key, 'value': value}
+        log.commit('item.set', payload, lambda: self.apply_op('item.set', payload))
+
+
+def open_log(directory, store, **kwargs):
+    replayed, lsn = persistence._recover(directory, store.load_state, store.apply_op)
+    return persistence.OperationLog(directory, store.dump_state, fsync_interval=0,
+                                    start_lsn=lsn, **kwargs)
+
+
+def recovered(directory):
+    store = Store()
+    persistence.recover(directory, store.load_state, store.apply_op)
+    return store.state
+
+
+def test_recovery_round_trip(tmp_path):
+    store = Store()
+    log = open_log(tmp_path, store)
+    threads = [threading.Thread(target=lambda i=i: [store.commit(log, f'{i}-{n}', n) for n in range(50)])
+               for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    log.close()
+
+    assert recovered(tmp_path) == store.state
+    assert store.state['count'] == 200
+
+
+def test_recovery_from_snapshot_and_log(tmp_path):
+    store = Store()
+    log = open_log(tmp_path, store)
+    for n in range(10):
+        store.commit(log, str(n), n)
+    log.snapshot()
+    for n in range(10, 15):
+        store.commit(log, str(n), n)
+    log.close()
+
+    assert recovered(tmp_path) == store.state
+    # Reopening continues the numbering across restarts
+    second = Store()
+    log = open_log(tmp_path, second)
+    second.commit(log, 'late', 1)
+    log.snapshot()
+    log.close()
+    state = recovered(tmp_path)
+    assert state == second.state
+    assert state['count'] == 16 and state['items']['late'] == 1
+
+
+def test_crash_between_snapshot_and_truncate(tmp_path):
+    store = Store()
+    log = open_log(tmp_path, store)
+    for n in range(10):
+        store.commit(log, str(n), n)
+    untruncated = tmp_path / 'untruncated'
+    shutil.copy(log.log_path, untruncated)
+    log.snapshot()
+    log.close()
+    # The crash left the snapshot in place but the old log untruncated
+    os.replace(untruncated, tmp_path / persistence.LOG_FILE)
+
+    assert recovered(tmp_path) == store.state
+
+    # Writing after such a recovery keeps later records
+    reopened = Store()
+    log = open_log(tmp_path, reopened)
+    reopened.commit(log, 'after', 1)
+    log.close()
+    assert recovered(tmp_path)['count'] == 11
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    store = Store()
+    log = open_log(tmp_path, store)
+    for n in range(5):
+        store.commit(log, str(n), n)
+    log.close()
+    size = log.log_path.stat().st_size
+    with open(log.log_path, 'ab') as f:
+        f.write(b'\x10\x00\x00\x00garbage')
+
+    assert recovered(tmp_path) == store.state
+    assert log.log_path.stat().st_size == size
+
+
+def test_flusher_failure_fails_writers(tmp_path, monkeypatch):
+    store = Store()
+    log = open_log(tmp_path, store)
+
+    def fail(fd):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(persistence.os, 'fsync', fail)
+    result = {}
+
+    def write():
+        try:
+            store.commit(log, 'a', 1)
+        except OSError as e:
+            result['error'] = e
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    writer.join(5)
+    assert not writer.is_alive()
+    assert str(result['error']) == 'disk full'
+
+    # Later writes fail before changing the store
+    with pytest.raises(OSError):
+        store.commit(log, 'b', 2)
+    assert 'b' not in store.state['items']
+
+
+class SlowToPickle:
+    """State value whose pickling takes a while, like a large store."""
+
+    def __init__(self, started):
+        self.started = started
+
+    def __reduce__(self):
+        self.started.set()
+        time.sleep(0.5)
+        return (dict, ())
+
+
+def test_writes_continue_while_snapshot_is_pickled(tmp_path):
+    store = Store()
+    log = open_log(tmp_path, store)
+    store.commit(log, 'before', 1)
+    started = threading.Event()
+    dump_state = store.dump_state
+    log.dump_state = lambda: {**dump_state(), 'slow': SlowToPickle(started)}
+    snapshotter = threading.Thread(target=log.snapshot)
+    snapshotter.start()
+    assert started.wait(5)
+
+    start = time.perf_counter()
+    store.commit(log, 'during', 2)
+    assert time.perf_counter() - start < 0.25
+    snapshotter.join()
+    log.close()
+
+    # The snapshot holds the copy taken before the write; the log has the write
+    state = recovered(tmp_path)
+    assert state['items'] == {'before': 1, 'during': 2}
+    assert state['count'] == 2
+
+
+def test_crash_before_snapshot_is_written(tmp_path, monkeypatch):
+    store = Store()
+    log = open_log(tmp_path, store)
+    for n in range(5):
+        store.commit(log, str(n), n)
+    log.snapshot()
+    for n in range(5, 10):
+        store.commit(log, str(n), n)
+
+    replace = os.replace
+
+    def crash(src, dst):
+        if dst == log.snapshot_path:
+            raise OSError('crashed')
+        replace(src, dst)
+
+    # The log is rotated but the new snapshot never replaces the old one
+    monkeypatch.setattr(persistence.os, 'replace', crash)
+    with pytest.raises(OSError):
+        log.snapshot()
+    monkeypatch.undo()
+    store.commit(log, 'after', 1)
+    log.close()
+    assert (tmp_path / persistence.PREVIOUS_LOG_FILE).exists()
+    assert recovered(tmp_path) == store.state
+
+    # Snapshots after the recovery keep the records only the rotated log had
+    reopened = Store()
+    log = open_log(tmp_path, reopened)
+    reopened.commit(log, 'later', 1)
+    log.snapshot()
+    log.close()
+    assert not (tmp_path / persistence.PREVIOUS_LOG_FILE).exists()
+    state = recovered(tmp_path)
+    assert state == reopened.state == {**store.state, 'count': 12,
+                                      'items': {**store.state['items'], 'later': 1}}
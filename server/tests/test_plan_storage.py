@@ -0,0 +1,30 @@
+import struct
+
+import pytest
+
+import plan_storage
+from services.openai_service import BUILTIN_MEAL_DATABASE, generate_meal_plan
+
+
+def test_frozen_dictionary_matches_its_id():
+    dictionary = plan_storage._dictionary_path(plan_storage.DICTIONARY_ID).read_bytes()
+    assert plan_storage._get_codec().dictionary == dictionary
+
+
+def test_blobs_stay_readable_when_builtin_recipes_change(monkeypatch):
+    plan = generate_meal_plan(days=2, seed=4101)
+    blob = plan_storage.pack_content(plan)
+
+    recipe = dict(BUILTIN_MEAL_DATABASE["lunches"][0], name="Renamed Lunch")
+    monkeypatch.setitem(BUILTIN_MEAL_DATABASE, "lunches", [recipe, *BUILTIN_MEAL_DATABASE["lunches"][1:]])
+    monkeypatch.setattr(plan_storage, "_codecs", {})
+
+    assert plan_storage.build_dictionary() != plan_storage._get_codec().dictionary
+    assert plan_storage.unpack_content(blob) == plan
+
+
+def test_unknown_dictionary_is_rejected():
+    blob = plan_storage.pack_content({"days": []})
+    codec, _ = struct.unpack_from("<cI", blob)
+    with pytest.raises(ValueError, match="unknown dictionary"):
+        plan_storage.unpack_content(struct.pack("<cI", codec, 0x12345678) + blob[5:])
@@ -0,0 +1,86 @@
+import threading
+
+
+def _generate(client, headers, days=2):
+    response = client.post('/api/mealplans/generate', json={'days': days}, headers=headers)
+    assert response.status_code == 201
+    return response.get_json()['meal_plan']
+
+
+def test_update_requires_meal_macros(client, auth_headers):
+    plan = _generate(client, auth_headers)
+    content = plan['plan_content']
+    del content['days'][0]['meals'][0]['protein']
+
+    response = client.put(f"/api/mealplans/{plan['id']}", json={'plan_content': content},
+                          headers=auth_headers)
+    assert response.status_code == 400
+    assert 'protein' in response.get_json()['error']
+
+
+def test_regenerate_after_update_without_day_totals(client, auth_headers):
+    plan = _generate(client, auth_headers)
+    content = plan['plan_content']
+    for day in content['days']:
+        for key in [key for key in day if key.startswith('total_')]:
+            del day[key]
+    response = client.put(f"/api/mealplans/{plan['id']}", json={'plan_content': content},
+                          headers=auth_headers)
+    assert response.status_code == 200
+
+    response = client.post(f"/api/mealplans/{plan['id']}/regenerate",
+                           json={'day': 1, 'meal': 'Lunch', 'recipe': 'Lentil Soup'},
+                           headers=auth_headers)
+    assert response.status_code == 200
+    day = response.get_json()['day']
+    assert day['total_calories'] == sum(meal['calories'] for meal in day['meals'])
+
+
+def test_concurrent_regenerations_keep_both_edits(client, auth_headers):
+    from app import app
+
+    for _ in range(20):
+        plan = _generate(client, auth_headers, days=1)
+        edits = [('Lunch', 'Lentil Soup'), ('Dinner', 'Vegetable Curry')]
+        barrier = threading.Barrier(len(edits))
+        statuses = []
+
+        def regenerate(meal, recipe):
+            thread_client = app.test_client()
+            barrier.wait()
+            response = thread_client.post(f"/api/mealplans/{plan['id']}/regenerate",
+                                          json={'day': 1, 'meal': meal, 'recipe': recipe},
+                                          headers=auth_headers)
+            statuses.append(response.status_code)
+
+        threads = [threading.Thread(target=regenerate, args=edit) for edit in edits]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert statuses == [200, 200]
+
+        stored = client.get(f"/api/mealplans/{plan['id']}", headers=auth_headers).get_json()
+        meals = {meal['type']: meal['name'] for meal in stored['meal_plan']['plan_content']['days'][0]['meals']}
+        assert meals['Lunch'] == 'Lentil Soup'
+        assert meals['Dinner'] == 'Vegetable Curry'
+
+
+def test_edits_leave_snapshot_copies_unchanged(client, auth_headers):
+    import copy
+
+    import models
+
+    plan = _generate(client, auth_headers)
+    state = models.dump_state()
+    before = copy.deepcopy(state['meal_plans'][plan['id']])
+
+    response = client.post(f"/api/mealplans/{plan['id']}/regenerate", json={'day': 1},
+                           headers=auth_headers)
+    assert response.status_code == 200
+    response = client.put(f"/api/mealplans/{plan['id']}", json={'preferences': 'vegetarian'},
+                          headers=auth_headers)
+    assert response.status_code == 200
+
+    assert state['meal_plans'][plan['id']] == before
+    assert models.meal_plans_db[plan['id']] is not state['meal_plans'][plan['id']]
@@ -0,0 +1,44 @@
+import threading
+
+from services import search
+from services.openai_service import MEAL_DATABASE
+
+
+def test_search_runs_concurrently_with_plan_writes():
+    names = [recipe["name"] for recipes in MEAL_DATABASE.values() for recipe in recipes]
+    user_id = "search-test"
+    stop = threading.Event()
+    errors = []
+
+    def write():
+        plan_id = 0
+        while not stop.is_set():
+            plan_id += 1
+            search.index_plan(user_id, str(plan_id), names)
+            if plan_id > 50:
+                search.unindex_plan(user_id, str(plan_id - 50), names)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        for _ in range(2000):
+            try:
+                search.search(user_id, "chicken salad")
+            except RuntimeError as e:
+                errors.append(e)
+    finally:
+        stop.set()
+        writer.join()
+        search.user_recipe_plans.pop(user_id, None)
+    assert errors == []
+
+
+def test_search_ranks_plans_by_matching_recipes():
+    search.index_plan("ranking-test", "1", ["Grilled Chicken Salad"])
+    search.index_plan("ranking-test", "2", ["Lentil Soup"])
+    try:
+        result = search.search("ranking-test", "chicken")
+    finally:
+        search.user_recipe_plans.pop("ranking-test", None)
+    assert [plan["id"] for plan in result["plans"]] == ["1"]
+    assert result["plans"][0]["matched_recipes"] == ["Grilled Chicken Salad"]
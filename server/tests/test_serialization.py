@@ -0,0 +1,31 @@
+import plan_storage
+import serialization
+from serialization import dumps_bytes, encode_plan_content, invalidate_plan
+
+
+def test_encoding_cached_for_unchanged_plan():
+    plan = {"id": "serialization-1", "plan_content": {"days": []}}
+    try:
+        assert encode_plan_content(plan) == dumps_bytes({"days": []})
+        assert "serialization-1" in serialization.plan_content_cache
+    finally:
+        invalidate_plan("serialization-1")
+
+
+def test_encoding_not_cached_across_invalidation(monkeypatch):
+    plan = {"id": "serialization-2", "plan_content": {"days": []}}
+    encoded_content = plan_storage.encoded_content
+
+    def encode_during_write(record):
+        encoded = encoded_content(record)
+        # The plan changes after its old bytes were computed
+        record["plan_content"] = {"days": [{"day": 1}]}
+        invalidate_plan(record["id"])
+        return encoded
+
+    monkeypatch.setattr(plan_storage, "encoded_content", encode_during_write)
+    try:
+        encode_plan_content(plan)
+        assert "serialization-2" not in serialization.plan_content_cache
+    finally:
+        invalidate_plan("serialization-2")
@@ -0,0 +1,89 @@
+import random
+from collections import Counter
+
+import pytest
+
+from services import history
+from services.openai_service import VarietyPicker, current_catalog, generate_meal_plan
+
+
+class FirstChoice:
+    """RNG that always offers the first recipe and accepts every pick."""
+
+    def choice(self, seq):
+        return seq[0]
+
+    def random(self):
+        return 0.0
+
+
+@pytest.fixture
+def clean_history():
+    history.clear()
+    yield
+    history.clear()
+
+
+def meal_names(plan, meal_type):
+    return [meal['name'] for day in plan['days'] for meal in day['meals']
+            if meal['type'] == meal_type]
+
+
+def test_picker_falls_back_to_an_unused_recipe():
+    breakfasts = current_catalog()['breakfasts']
+    pick = VarietyPicker(FirstChoice())
+    names = [pick('Breakfast')['name'] for _ in breakfasts]
+    assert names == [recipe['name'] for recipe in breakfasts]
+    # A new round starts once every recipe has been used
+    assert pick('Breakfast')['name'] == breakfasts[0]['name']
+
+
+def test_variety_plans_do_not_repeat_within_a_round():
+    days = len(current_catalog()['breakfasts'])
+    for seed in range(200):
+        plan = generate_meal_plan(days, seed=seed, variety=True)
+        assert plan['variety'] is True
+        for meal_type in ('Breakfast', 'Lunch', 'Dinner'):
+            names = meal_names(plan, meal_type)
+            assert len(set(names)) == len(names)
+
+
+def test_recent_recipes_are_drawn_less_often():
+    breakfasts = current_catalog()['breakfasts']
+    recent = {breakfasts[0]['name']: 10.0}
+    rng = random.Random(1)
+    counts = Counter(VarietyPicker(rng, recent)('Breakfast')['name'] for _ in range(2000))
+    others = [counts[recipe['name']] for recipe in breakfasts[1:]]
+    assert counts[breakfasts[0]['name']] < min(others) / 2
+
+
+def test_history_decays_and_is_per_user(clean_history):
+    history.record_plan('1', ['Oatmeal', 'Salad', 'Salad'])
+    history.record_plan('1', ['Oatmeal'])
+    counts = history.recent_counts('1')
+    assert counts['Oatmeal'] == pytest.approx(1.0 * history.DECAY + 1.0)
+    assert counts['Salad'] == pytest.approx(2.0 * history.DECAY)
+    assert history.recent_counts('2') == {}
+
+    # Callers get a copy
+    counts['Oatmeal'] = 100.0
+    assert history.recent_counts('1')['Oatmeal'] < 100.0
+
+
+def test_history_drops_light_entries_and_stays_bounded(clean_history):
+    history.record_plan('1', ['Old'])
+    for n in range(10):
+        history.record_plan('1', [f'Recipe {n}-{i}' for i in range(history.CAPACITY)])
+    counts = history.recent_counts('1')
+    assert 'Old' not in counts
+    assert len(counts) == history.CAPACITY
+    assert all(name.startswith('Recipe 9-') for name in counts)
+
+
+def test_generated_plans_feed_history(client, auth_headers, clean_history):
+    response = client.post('/api/mealplans/generate', json={'days': 2, 'variety': True},
+                           headers=auth_headers)
+    assert response.status_code == 201
+    plan = response.get_json()['meal_plan']
+    counts = history.recent_counts(plan['user_id'])
+    assert set(counts) == set(plan['recipes'])
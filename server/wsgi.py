@@ -0,0 +1,11 @@
+"""
+Production WSGI entry point.
+
+Run with:
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from app import app, warmup
+
+# Runs once in the gunicorn master when preload_app is enabled
+warmup()